@@ -9,6 +9,7 @@ CTemporal *temporalModel;
 int trainingTimes[MAX_SIGNAL_LENGTH];
 unsigned char trainingStates[MAX_SIGNAL_LENGTH];
 int testingTime;
+uint32_t testingTimes[MAX_SIGNAL_LENGTH];
 float predictions[MAX_SIGNAL_LENGTH];
 
 int testingLength = 0;
@@ -53,9 +54,14 @@ int main(int argc,char *argv[])
 	file=fopen(argv[2],"r");
 	while (feof(file)==0){
 		fscanf(file,"%i\n",&testingTime);
-		predictions[testingLength++] = temporalModel->predict(testingTime);
+		testingTimes[testingLength++] = testingTime;
 	}
 	fclose(file);
+	if (temporalModel->predictBatch(testingTimes,predictions,testingLength) != testingLength){
+		//the batch failed, predictions are computed one by one
+		fprintf(stderr,"Batch prediction failed, predicting times one by one.\n");
+		for (int i =0;i<testingLength;i++) predictions[i] = temporalModel->predict(testingTimes[i]);
+	}
 
 	file=fopen("predictions.txt","w");
 	for (int i =0;i<testingLength;i++) fprintf(file,"%.3f\n",predictions[i]);
@@ -48,6 +48,7 @@ CPythonHyperTime::CPythonHyperTime(int id)
     // instead of export PYTHONPATH=`pwd` in terminal
     // stolen from https://stackoverflow.com/questions/46493307/embed-python-numpy-in-c
     setenv("PYTHONPATH", "../src/models/python", 1);
+    tableResolution = 0.0;
 
     /* Py_SetProgramName(argv[0]); //default 'python', I will not call that */
 
@@ -140,7 +141,9 @@ void CPythonHyperTime::update(int maxOrder,unsigned int* times,float* signal,int
 
 // v kazdem pripade bych nemel delat to numpy array z celeho toho arraye, ale jen z vyuzite casti. Pak se pouzije tato cas kodu, nebot pArray nebude obsahovat nesmyslne (nenaplnene) radky
     // np_ret = mymodule.array_tutorial(np_arr)
-    pModel = PyObject_CallFunctionObjArgs(pFunc, pArray, NULL);
+    PyObject *pResolution = PyFloat_FromDouble(tableResolution);
+    pModel = PyObject_CallFunctionObjArgs(pFunc, pArray, pResolution, NULL);
+    Py_XDECREF(pResolution);
     if (!pModel)
         std::cout << "python function did not respond" << std::endl;
 //zde predpokladame, ze pModel je pythoni objekt obsahujici libovolny pythoni bordel, ktery definuje model
@@ -230,6 +233,62 @@ float CPythonHyperTime::predict(uint32_t time)
 	return estimate(time);
 }
 
+// all times are handed over to python at once
+int CPythonHyperTime::predictBatch(uint32_t* times,float* predictions,int length)
+{
+    //instead of import_array();
+    import_numpy_stuff();
+
+    if (!pModel){
+        std::cout << "pModel does not exists" << std::endl;
+        return 0;
+    }
+    PyObject *pFunc7 = PyObject_GetAttrString(pModule,"python_function_estimate_batch");
+    if (!pFunc7 || !PyCallable_Check(pFunc7)){
+        std::cout << "python function estimate batch is not callable." << std::endl;
+        PyErr_Print();
+        Py_XDECREF(pFunc7);
+        return 0;
+    }
+    npy_intp dims[1]{length};
+    PyObject *pTimes = PyArray_SimpleNewFromData(
+        1, dims, NPY_UINT32, reinterpret_cast<void*>(times));
+    if (!pTimes){
+        std::cout << "numpy array of times was not created" << std::endl;
+        PyErr_Print();
+        Py_DECREF(pFunc7);
+        return 0;
+    }
+
+    PyObject *pEstimates = PyObject_CallFunctionObjArgs(pFunc7, pModel, pTimes, NULL);
+    Py_DECREF(pTimes);
+    Py_DECREF(pFunc7);
+    if (!pEstimates){
+        std::cout << "python function did not respond" << std::endl;
+        PyErr_Print();
+        return 0;
+    }
+    // estimations as a contiguous array of doubles
+    PyArrayObject *pArray7 = reinterpret_cast<PyArrayObject*>(
+        PyArray_FROM_OTF(pEstimates, NPY_DOUBLE, NPY_ARRAY_IN_ARRAY));
+    Py_DECREF(pEstimates);
+    if (!pArray7){
+        std::cout << "estimations are not an array of numbers" << std::endl;
+        PyErr_Print();
+        return 0;
+    }
+    if (PyArray_SIZE(pArray7) != length){
+        std::cout << "python function returned " << PyArray_SIZE(pArray7) << " estimations of " << length << std::endl;
+        Py_DECREF(pArray7);
+        return 0;
+    }
+    double* estimates = reinterpret_cast<double*>(PyArray_DATA(pArray7));
+    for (int i = 0;i<length;i++) predictions[i] = estimates[i];
+
+    Py_DECREF(pArray7);
+    return length;
+}
+
 int CPythonHyperTime::save(const char* name,bool lossy)
 {
 
@@ -287,7 +346,9 @@ int CPythonHyperTime::load(const char* name)
     if (!pPath4)
         std::cout << "unable to convert name to python string" << std::endl;
 
-    pModel = PyObject_CallFunctionObjArgs(pFunc4, pPath4, NULL);
+    PyObject *pResolution4 = PyFloat_FromDouble(tableResolution);
+    pModel = PyObject_CallFunctionObjArgs(pFunc4, pPath4, pResolution4, NULL);
+    Py_XDECREF(pResolution4);
 
 
     if (!pModel)
@@ -364,7 +425,9 @@ int CPythonHyperTime::importFromArray(double* array,int len)
         std::cout << "python function array to model was not created" << std::endl; //?
     if (!PyCallable_Check(pFunc6))
         std::cout << "python function array to model is not callable." << std::endl;
-    pModel = PyObject_CallFunctionObjArgs(pFunc6, pArray6, NULL);
+    PyObject *pResolution6 = PyFloat_FromDouble(tableResolution);
+    pModel = PyObject_CallFunctionObjArgs(pFunc6, pArray6, pResolution6, NULL);
+    Py_XDECREF(pResolution6);
     if (!pModel)
         std::cout << "python function did not respond, not sure what is inside pModel" << std::endl;
 
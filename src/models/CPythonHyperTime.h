@@ -39,6 +39,7 @@ class CPythonHyperTime: public CTemporal
 		//estimates the probability for the given times 
 		float estimate(uint32_t time);
 		float predict(uint32_t time);
+		int predictBatch(uint32_t* times,float* predictions,int length);
 
 		void update(int maxOrder,unsigned int* times = NULL,float* signal = NULL,int length = 0);
 		int exportToArray(double* array,int maxLen);
@@ -52,6 +53,8 @@ class CPythonHyperTime: public CTemporal
 		
 		char id[MAX_ID_LENGTH];
 		int measurements;
+		//step of the table of time-only models in seconds, 0 for the default of python_module
+		double tableResolution;
 
 		PyObject *pModuleName;
 		PyObject *pModule;
@@ -50,3 +50,9 @@ CTemporal* spawnTemporalModel(const char* type,int maxPeriod,int elements,int nu
 	for (i=0;i<TT_NUMBER && strcmp(type,temporalModelName[i])!=0;i++){}
 	return spawnTemporalModel( (ETemporalType)i,maxPeriod,elements,numClasses);
 }
+
+int CTemporal::predictBatch(uint32_t* times,float* predictions,int length)
+{
+	for (int i = 0;i<length;i++) predictions[i] = predict(times[i]);
+	return length;
+}
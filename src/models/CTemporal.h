@@ -43,6 +43,10 @@ class CTemporal
 		virtual float estimate(uint32_t time) = 0;
 		virtual float predict(uint32_t time) = 0;
 
+		//predicts the states for a buffer of times, calls predict() for every time unless overriden
+		//returns the number of predictions written, which is smaller than length (0) on failure
+		virtual int predictBatch(uint32_t* times,float* predictions,int length);
+
 		virtual void update(int maxOrder,unsigned int* times = NULL,float* signal = NULL,int length = 0) = 0;
 		virtual void print(bool verbose=true) = 0;
 
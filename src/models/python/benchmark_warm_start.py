@@ -0,0 +1,125 @@
+#!/usr/bin/env python2
+
+"""
+compares learning with clustering initialized by 'seeding' in every learning
+iteration and learning with warm start (centres and weights of the previous
+iteration lifted into the new hypertime space).
+call python benchmark_warm_start.py [path [seed]]
+and it prints the numbers of k-means iterations (warm-started clusterings
+with the same and with more clusters than the last learning iteration and
+the other clusterings separately), time of learning, found structure and
+the final diff for both variants.
+"""
+
+import sys
+import numpy as np
+from time import clock
+import clustering as cl
+import learning as lrn
+import dataset_io as dio
+import evaluation as ev
+
+
+iterations_counter = [0]
+# (kind of the clustering, iterations) per call
+clusterings = []
+original_new_centroids = cl.new_centroids
+original_k_means = cl.k_means
+
+
+def counted_new_centroids(*arguments, **keywords):
+    """
+    input: the same as cl.new_centroids()
+    output: the same as cl.new_centroids()
+    uses: cl.new_centroids()
+    objective: to count iterations of k-means (one new_centroids() call
+               per iteration)
+    """
+    iterations_counter[0] += 1
+    return original_new_centroids(*arguments, **keywords)
+
+
+def counted_k_means(*arguments, **keywords):
+    """
+    input: the same as cl.k_means()
+    output: the same as cl.k_means()
+    uses: cl.k_means()
+    objective: to count iterations of every k-means call, calls are split
+               into warm-started ones with the same number of clusters as
+               the last iteration, warm-started ones with more clusters and
+               the others (seeded)
+    """
+    C_in = keywords.get('C_in', -1)
+    if keywords.get('method') != 'warm_start':
+        kind = 'seeded'
+    elif np.ndim(C_in) == 2 and len(C_in) == arguments[1]:
+        kind = 'warm, same k'
+    else:
+        kind = 'warm, added clusters'
+    iterations_counter[0] = 0
+    outputs = original_k_means(*arguments, **keywords)
+    clusterings.append((kind, iterations_counter[0]))
+    return outputs
+
+
+def learn(data, seed, options):
+    """
+    input: data numpy array nxd, training data
+           seed int, seed of np.random
+           options dict, optional settings of learning (see learning.py)
+    output: iterations dict, numbers of iterations of k-means calls
+                             of every kind (see counted_k_means())
+            duration float, time of learning
+            structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+            k positive integer, number of clusters
+            diff float, difference between final model and reality
+    uses: np.random.seed(), time.clock(),
+          lrn.proposed_method(), dio.divide_dataset(), ev.evaluation_step()
+    objective: to learn the model with the settings of python_module
+    """
+    np.random.seed(seed)
+    del clusterings[:]
+    start = clock()
+    C, COV, density_integrals, structure, average, k =\
+        lrn.proposed_method(60*60*24*7*4, 60*60*4, data, [60], 1, 1.0, 4,
+                            True, options)
+    duration = clock() - start
+    evaluation_dataset = dio.divide_dataset(data)[1]
+    diff = ev.evaluation_step(evaluation_dataset, C, COV, density_integrals,
+                              structure, k, [60])
+    iterations = {}
+    for kind, number in clusterings:
+        iterations.setdefault(kind, []).append(number)
+    return iterations, duration, structure, k, diff
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = '../../../data/greg_door_2016_min/training_data.txt'
+    if len(sys.argv) > 2:
+        seed = int(sys.argv[2])
+    else:
+        seed = 0
+    data = dio.loading_data(path)
+    cl.new_centroids = counted_new_centroids
+    cl.k_means = counted_k_means
+    results = []
+    for name, options in (('cold start', {}),
+                          ('warm start', {'warm_start': True})):
+        results.append((name, learn(data, seed, options)))
+    for name, (iterations, duration, structure, k, diff) in results:
+        print('\n' + name)
+        for kind in ('warm, same k', 'warm, added clusters', 'seeded'):
+            if kind not in iterations:
+                continue
+            print('k-means iterations, ' + kind + ': ' +
+                  str(sum(iterations[kind])) + ' in ' +
+                  str(len(iterations[kind])) + ' clusterings (' +
+                  str(np.mean(iterations[kind])) + ' per clustering)')
+        print('time of learning: ' + str(duration))
+        print('structure: ' + str(structure) + ', k: ' + str(k))
+        print('diff: ' + str(diff))
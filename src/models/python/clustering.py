@@ -3,7 +3,8 @@
 """
 performs clustering of data
 call k_means(X, k, structure, method, version, fuzzyfier,
-             iterations, C_in, U_in)
+             iterations, C_in, U_in, block_size, accelerated, weights,
+             batch_size, forgetting, phases)
 where
 input: X numpy array nxd, matrix of n d-dimensional observations
        k positive integer, number of clusters
@@ -11,7 +12,10 @@ input: X numpy array nxd, matrix of n d-dimensional observations
                   number of non-hypertime dimensions, list of hypertime
                   radii nad list of wavelengths
        method string, defines type of initialization, possible ('random',
-                                                                'prev_dim')
+                                                                'prev_dim',
+                                                                'stable_init',
+                                                                'plus_plus',
+                                                                'warm_start')
        version string, version of making weights (possible 'fuzzy',
                                                   'model', 'hard')
        fuzzyfier number, larger or equal one, not too large, usually 2 or 1
@@ -19,9 +23,22 @@ input: X numpy array nxd, matrix of n d-dimensional observations
        C_in numpy array kxd, matrix of k d-dimensional cluster centres
                              from the last iteration
        U_in numpy array kxn, matrix of weights from the last iteration
+       block_size int, if positive and smaller than n, X is processed
+                       in blocks of block_size observations
+       accelerated bool, if True, hard version skips distances that can not
+                         change the partition
+       weights numpy array n, numbers of occurences of observations
+                              (or None, every observation once)
+       batch_size int, if positive and smaller than n, mini-batch version
+                       with batches of batch_size observations is used
+       forgetting float, (0, 1], forgetting of previous batches in
+                         mini-batch version, 1 for the learning rate 1/t
+       phases bool, if True, X and centres are in the phase representation
+                    (see dio.create_phases())
 and
 output: C numpy array kxd, matrix of k d-dimensional cluster centres
-        U numpy array kxn, matrix of weights
+        U numpy array kxn, matrix of weights (None if X was processed
+                                              in blocks)
         densities numpy array kx1, matrix of number of
                 measurements belonging to every cluster
 especially
@@ -37,19 +54,60 @@ stable_init initialization: gets U_in as a weights from last clustering (above
                             smaller hypertime-space) and use them on X
                             transformed into new space to create new C (using
                             usual way)
+plus_plus initialization: k-means++ seeding, the first centre is a random
+                          point of X, every next one is chosen with
+                          the probability proportional to the squared
+                          (hypertime) distance from the closest already
+                          chosen centre
 fuzzy version: creates fuzzy partition matrix, recommended value for fuzzyfier
                is 2
 hard version: creates crisp c-means partition matrix, recommended value for
               fuzzyfier is 1
 model version: creates fuzzy partition matrix with values of weghts limited
                to eaual or less than 1
+warm_start initialization: centres are weighted means of X using U_in (or
+                           the partition of X by C_in in the smaller
+                           hypertime-space), missing centres are added
+                           by k-means++
+accelerated hard version: gives the same centres, weights and number of
+                          iterations as the hard version, but distances
+                          to other centres than the assigned one are
+                          computed only for observations, where the bounds
+                          (triangle inequality) do not guarantee, that
+                          the assigned centre is the closest one
+weighted clustering: every observation counts as weights[i] observations
+                     (see dio.collapse_points()), it gives the same centres
+                     as clustering of repeated observations, but random
+                     initialization chooses from distinct observations
+mini-batch clustering: in every iteration (for 'hard' and 'fuzzy' version)
+                       centres are moved towards the weighted means of
+                       a random batch of observations, the learning rate
+                       of a centre is the ratio of its weights in the batch
+                       and its (forgotten) weights in all previous batches;
+                       densities are computed in a final pass over X (in
+                       blocks), U is not kept
+phase representation: hypertime substractions are arcs between phases,
+                      centres of circles are circular means (they lie on
+                      circles), 'prev_dim' initialization and accelerated
+                      version are not available
+blocked clustering: gives the same centres and densities, but only one block
+                    of U (and distances) exists at a time, the sums U^m X
+                    and U^m are accumulated over blocks
 """
 import numpy as np
 import dataset_io as dio
 
 
+# absolute slack (per unit of radius) of bounds in accelerated_k_means(),
+# it covers rounding of arccos near +-1
+BOUND_TOLERANCE = 1e-6
+# mini-batch clustering stops, when no centre moves more (per unit of radius)
+MINI_BATCH_TOLERANCE = 1e-4
+
+
 def k_means(X, k, structure, method, version, fuzzyfier,
-            iterations, C_in, U_in):
+            iterations, C_in, U_in, block_size=0, accelerated=False,
+            weights=None, batch_size=0, forgetting=1.0, phases=False):
     """
     input: X numpy array nxd, matrix of n d-dimensional observations
            k positive integer, number of clusters
@@ -57,7 +115,9 @@ def k_means(X, k, structure, method, version, fuzzyfier,
                       number of non-hypertime dimensions, list of hypertime
                       radii nad list of wavelengths
            method string, defines type of initialization, possible ('random',
-                                                                    'prev_dim')
+                                                                    'prev_dim',
+                                                                    'plus_plus',
+                                                                    'warm_start')
            version string, version of making weights (possible 'fuzzy',
                                                       'model', 'hard')
            fuzzyfier number, larger or equal one, not too large, usually 2 or 1
@@ -65,31 +125,68 @@ def k_means(X, k, structure, method, version, fuzzyfier,
            C_in numpy array kxd, matrix of k d-dimensional cluster centres
                                  from the last iteration
            U_in numpy array kxn, matrix of weights from the last iteration
+           block_size int, if positive and smaller than n, X is processed
+                           in blocks of block_size observations
+           accelerated bool, if True, hard version skips distances that
+                             can not change the partition
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+           batch_size int, if positive and smaller than n, mini-batch
+                           version with batches of batch_size observations
+                           is used, iterations is the number of batches
+           forgetting float, (0, 1], forgetting of previous batches in
+                             mini-batch version
+           phases bool, if True, X and centres are in the phase
+                        representation (see dio.create_phases())
     output: C numpy array kxd, matrix of k d-dimensional cluster centres
-            U numpy array kxn, matrix of weights
+            U numpy array kxn, matrix of weights (None if X was processed
+                                                  in blocks or batches)
             densities numpy array kx1, matrix of number of
                     measurements belonging to every cluster
     uses: np.shape(), np.sum(),
           initialization(), distance_matrix(), partition_matrix(),
-          new_centroids()
+          new_centroids(), blocked_k_means(), accelerated_k_means(),
+          mini_batch_k_means()
     objective: perform some kind of k-means
     """
     #print('starting clustering')
-    d = np.shape(X)[1]
+    n, d = np.shape(X)
+    if batch_size > 0 and n > batch_size and version in ('hard', 'fuzzy'):
+        return mini_batch_k_means(X, k, structure, method, version,
+                                  fuzzyfier, iterations, C_in, U_in,
+                                  batch_size, block_size, weights, forgetting,
+                                  phases)
+    if block_size > 0 and n > block_size:
+        return blocked_k_means(X, k, structure, method, version, fuzzyfier,
+                               iterations, C_in, U_in, block_size, weights,
+                               phases)
     J_old = 0
-    C, U = initialization(X, k, method, C_in, U_in, structure, version)
+    C, U = initialization(X, k, method, C_in, U_in, structure, version,
+                          weights, phases)
+    # buffers reused by distance_matrix() in every iteration
+    XC = np.empty((k, n, structure[0] + len(structure[1])))
+    workspace = np.empty((k, n))
+    if accelerated and version == 'hard' and not phases:
+        return accelerated_k_means(X, C, structure, fuzzyfier, iterations,
+                                   XC, workspace, weights)
     for iteration in range(iterations):
-        D = distance_matrix(X, C, U, structure)
+        D = distance_matrix(X, C, U, structure, XC, workspace, phases)
         U = partition_matrix(D, version)
-        C = new_centroids(X, U, k, d, fuzzyfier)
-        J_new = np.sum(U * D)
+        C = new_centroids(X, U, k, d, fuzzyfier, weights, structure, phases)
+        if weights is None:
+            J_new = np.sum(U * D)
+        else:
+            J_new = np.sum(U * D * weights)
         if abs(J_old - J_new) < 0.01:
             #print('no changes! breaking loop.')
             break
         #if iteration % 10 == 0:
         #    print('iteration: ' + str(iteration))
         J_old = J_new
-    densities = np.sum(U, axis=1, keepdims=True)
+    if weights is None:
+        densities = np.sum(U, axis=1, keepdims=True)
+    else:
+        densities = np.sum(U * weights, axis=1, keepdims=True)
     #print('number of clustering iteration: ' + str(iteration))
 #    print('output centres:')
 #    print(list(C))
@@ -99,28 +196,339 @@ def k_means(X, k, structure, method, version, fuzzyfier,
     return C, U, densities
 
 
-def distance_matrix(X, C, U, structure):
+def blocked_k_means(X, k, structure, method, version, fuzzyfier,
+                    iterations, C_in, U_in, block_size, weights=None,
+                    phases=False):
+    """
+    input: the same as k_means(), block_size positive integer
+    output: C numpy array kxd, matrix of k d-dimensional cluster centres
+            U None, matrix of weights is not kept
+            densities numpy array kx1, matrix of number of
+                    measurements belonging to every cluster
+    uses: np.shape(), np.random.choice(), np.arange(), np.empty(),
+          np.zeros(), np.sum(), np.dot(),
+          initialization(), plus_plus_centres(), warm_start_centres(),
+          distance_matrix(), partition_matrix()
+    objective: perform the same k-means as k_means() in bounded memory,
+               X is streamed in blocks and U^m X and sum(U^m) are accumulated
+               by matrix products, so only one block of U exists at a time
+    """
+    n, d = np.shape(X)
+    if method == 'random':
+        C = X[np.random.choice(np.arange(n), size=k, replace=False), :]
+    elif method == 'plus_plus':
+        C = plus_plus_centres(X, k, structure, block_size, weights=weights,
+                              phases=phases)
+    elif method == 'warm_start':
+        C = warm_start_centres(X, k, C_in, U_in, structure, block_size,
+                               weights, phases)
+    else:
+        C, U = initialization(X, k, method, C_in, U_in, structure, version,
+                              weights, phases)
+        U = None
+    # buffers reused by distance_matrix() in every block
+    XC = np.empty((k, block_size, structure[0] + len(structure[1])))
+    workspace = np.empty((k, block_size))
+    J_old = 0
+    for iteration in range(iterations):
+        weighted_sums = np.zeros((k, centroid_width(d, structure, phases)))
+        sums_of_weights = np.zeros((k, 1))
+        densities = np.zeros((k, 1))
+        J_new = 0
+        for start in range(0, n, block_size):
+            X_block = X[start: start + block_size]
+            m = np.shape(X_block)[0]
+            D = distance_matrix(X_block, C, None, structure, XC[:, : m],
+                                workspace[:, : m], phases)
+            U = partition_matrix(D, version)
+            if weights is None:
+                W = U
+            else:
+                W = U * weights[start: start + block_size]
+            J_new += np.sum(W * D)
+            densities += np.sum(W, axis=1, keepdims=True)
+            U = U ** fuzzyfier
+            if weights is not None:
+                U = U * weights[start: start + block_size]
+            weighted_sums += np.dot(U, circle_coordinates(X_block, structure,
+                                                          phases))
+            sums_of_weights += np.sum(U, axis=1, keepdims=True)
+        C = from_circle_coordinates(weighted_sums / sums_of_weights,
+                                    structure, phases)
+        if abs(J_old - J_new) < 0.01:
+            break
+        J_old = J_new
+    return C, None, densities
+
+
+def mini_batch_k_means(X, k, structure, method, version, fuzzyfier,
+                       iterations, C_in, U_in, batch_size, block_size=0,
+                       weights=None, forgetting=1.0, phases=False):
+    """
+    input: the same as k_means(), batch_size positive integer, iterations
+           is the maximal number of batches
+    output: C numpy array kxd, matrix of k d-dimensional cluster centres
+            U None, matrix of weights is not kept
+            densities numpy array kx1, matrix of number of
+                    measurements belonging to every cluster
+    uses: np.shape(), np.random.choice(), np.arange(), np.cumsum(),
+          np.searchsorted(), np.random.rand(), np.random.randint(),
+          np.empty(), np.zeros(), np.sum(), np.dot(), np.maximum(),
+          np.max(), np.abs(),
+          initialization(), plus_plus_centres(), warm_start_centres(),
+          distance_matrix(), partition_matrix(), cluster_densities(),
+          circle_coordinates(), from_circle_coordinates()
+    objective: perform stochastic (mini-batch) k-means, the cost of one
+               iteration does not depend on n; observations of batches
+               are drawn with replacement (with probabilities proportional
+               to weights), centres move towards the weighted means
+               of batches with the learning rate given by the weights
+               accumulated by the centres
+    """
+    n, d = np.shape(X)
+    if method == 'random':
+        C = X[np.random.choice(np.arange(n), size=k, replace=False), :]
+    elif method == 'plus_plus':
+        C = plus_plus_centres(X, k, structure, block_size, weights=weights,
+                              phases=phases)
+    elif method == 'warm_start':
+        C = warm_start_centres(X, k, C_in, U_in, structure, block_size,
+                               weights, phases)
+    else:
+        C, U = initialization(X, k, method, C_in, U_in, structure, version,
+                              weights, phases)
+    if weights is not None:
+        cumulative_weights = np.cumsum(weights)
+        cumulative_weights /= cumulative_weights[-1]
+    # buffers reused by distance_matrix() in every batch
+    XC = np.empty((k, batch_size, structure[0] + len(structure[1])))
+    workspace = np.empty((k, batch_size))
+    tolerance = MINI_BATCH_TOLERANCE * (1.0 + max(list(structure[1]) +
+                                                   [0.0]))
+    accumulated_weights = np.zeros((k, 1))
+    for iteration in range(iterations):
+        if weights is None:
+            batch = np.random.randint(n, size=batch_size)
+        else:
+            batch = np.searchsorted(cumulative_weights,
+                                    np.random.rand(batch_size), side='right')
+            batch = np.minimum(batch, n - 1)
+        X_batch = X[batch]
+        D = distance_matrix(X_batch, C, None, structure, XC, workspace,
+                            phases)
+        U = partition_matrix(D, version) ** fuzzyfier
+        sums_of_weights = np.sum(U, axis=1, keepdims=True)
+        accumulated_weights = forgetting * accumulated_weights +\
+            sums_of_weights
+        rates = sums_of_weights / np.maximum(accumulated_weights,
+                                             np.finfo(float).tiny)
+        means = np.dot(U, circle_coordinates(X_batch, structure, phases)) /\
+            np.maximum(sums_of_weights, np.finfo(float).tiny)
+        C_circles = circle_coordinates(C, structure, phases)
+        shifts = rates * (means - C_circles)
+        C = from_circle_coordinates(C_circles + shifts, structure, phases)
+        if np.max(np.abs(shifts)) < tolerance:
+            break
+    densities = cluster_densities(X, C, structure, version, block_size or
+                                  batch_size, weights, phases)
+    return C, None, densities
+
+
+def cluster_densities(X, C, structure, version, block_size, weights=None,
+                      phases=False):
+    """
+    input: X numpy array nxd, matrix of n d-dimensional observations
+           C numpy array kxd, matrix of k d-dimensional cluster centres
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           version string, version of making weights (possible 'fuzzy',
+                                                      'model', 'hard')
+           block_size positive integer, number of observations in one block
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+    output: densities numpy array kx1, matrix of number of
+                    measurements belonging to every cluster
+    uses: np.shape(), np.zeros(), np.sum(),
+          distance_matrix(), partition_matrix()
+    objective: to sum weights of observations in clusters in one pass
+               over X (in blocks)
+    """
+    n = np.shape(X)[0]
+    densities = np.zeros((np.shape(C)[0], 1))
+    for start in range(0, n, block_size):
+        D = distance_matrix(X[start: start + block_size], C, None, structure,
+                            phases=phases)
+        U = partition_matrix(D, version)
+        if weights is not None:
+            U = U * weights[start: start + block_size]
+        densities += np.sum(U, axis=1, keepdims=True)
+    return densities
+
+
+def accelerated_k_means(X, C, structure, fuzzyfier, iterations,
+                        XC=None, workspace=None, weights=None):
+    """
+    input: X numpy array nxd, matrix of n d-dimensional observations
+           C numpy array kxd, matrix of k initial d-dimensional centres
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           fuzzyfier number, larger or equal one, usually 1
+           iterations integer, max number of iterations
+           XC numpy array kxnxWTF, preallocated buffer for substractions
+                                   (or None)
+           workspace numpy array kxn, preallocated temporary array (or None)
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+    output: C numpy array kxd, matrix of k d-dimensional cluster centres
+            U numpy array kxn, matrix of weights
+            densities numpy array kx1, matrix of number of
+                    measurements belonging to every cluster
+    uses: np.shape(), np.arange(), np.sqrt(), np.sum(), np.min(),
+          np.maximum(), np.flatnonzero(), np.zeros(), np.diag(), np.max(),
+          dio.hypertime_pair_differences(), distance_matrix(),
+          closest_centres(), centre_distances(), new_centroids()
+    objective: to perform the same hard k-means as k_means() (the same
+               partitions, centres and objective function in every
+               iteration), but to skip distances, that can not change
+               the partition (Hamerly's algorithm); distances to assigned
+               centres are computed in every iteration (objective function
+               needs them), distances to all centres only for observations,
+               whose distance to the assigned centre is not lower than
+               the lower bound of distances to other centres and not lower
+               than the half of the distance between the assigned centre
+               and its closest centre
+    """
+    n, d = np.shape(X)
+    k = np.shape(C)[0]
+    positions = np.arange(n)
+    tolerance = BOUND_TOLERANCE * (1.0 + max(list(structure[1]) + [0.0]))
+    J_old = 0
+    for iteration in range(iterations):
+        if iteration == 0:
+            D = distance_matrix(X, C, None, structure, XC, workspace)
+            labels, upper, lower = closest_centres(D)
+        else:
+            upper = np.sqrt(np.sum(dio.hypertime_pair_differences(
+                X, C[labels], structure) ** 2, axis=1))
+            CC = centre_distances(C, C, structure)
+            CC[np.arange(k), np.arange(k)] = np.inf
+            half = 0.5 * np.min(CC, axis=1)
+            bound = np.maximum(half[labels], lower)
+            checked = np.flatnonzero(upper + tolerance >= bound)
+            m = len(checked)
+            if m > 0:
+                if XC is None:
+                    D = distance_matrix(X[checked], C, None, structure)
+                else:
+                    D = distance_matrix(X[checked], C, None, structure,
+                                        XC[:, : m], workspace[:, : m])
+                labels[checked], upper[checked], lower[checked] =\
+                    closest_centres(D)
+        U = np.zeros((k, n))
+        U[labels, positions] = 1
+        C_new = new_centroids(X, U, k, d, fuzzyfier, weights)
+        # the same matrix as U * D (* weights) in k_means()
+        UD = np.zeros((k, n))
+        if weights is None:
+            UD[labels, positions] = upper
+        else:
+            UD[labels, positions] = upper * weights
+        J_new = np.sum(UD)
+        shifts = np.diag(centre_distances(C, C_new, structure))
+        lower -= np.max(shifts) + tolerance
+        C = C_new
+        if abs(J_old - J_new) < 0.01:
+            break
+        J_old = J_new
+    if weights is None:
+        densities = np.sum(U, axis=1, keepdims=True)
+    else:
+        densities = np.sum(U * weights, axis=1, keepdims=True)
+    return C, U, densities
+
+
+def closest_centres(D):
+    """
+    input: D numpy array kxn, matrix of distances between every observation
+           and every center
+    output: labels numpy array n, indices of the closest centres (the same
+                                  as in partition_matrix())
+            upper numpy array n, distances to the closest centres
+            lower numpy array n, distances to the second closest centres
+                                 (inf if k == 1)
+    uses: np.argmin(), np.arange(), np.shape(), np.min()
+    objective: to find assigned centres and bounds for accelerated_k_means(),
+               D is overwritten
+    """
+    labels = np.argmin(D, axis=0)
+    positions = np.arange(np.shape(D)[1])
+    upper = D[labels, positions]
+    D[labels, positions] = np.inf
+    lower = np.min(D, axis=0)
+    return labels, upper, lower
+
+
+def centre_distances(A, B, structure):
+    """
+    input: A numpy array kxd, matrix of k d-dimensional cluster centres
+           B numpy array lxd, matrix of l d-dimensional cluster centres
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+    output: D numpy array kxl, matrix of distances between every centre of A
+                               and every centre of B
+    uses: np.empty(), np.sqrt(), np.clip(), np.sum(), np.dot(), np.outer(),
+          np.arccos()
+    objective: to find distances between centres, that satisfy the triangle
+               inequality together with distances of distance_matrix();
+               a centre c (lying inside the circle of radius r) is lifted
+               onto the hemisphere (c/r, sqrt(1 - |c|^2/r^2)) and
+               an observation x lies on its equator (x/r, 0), so the arc
+               r*arccos(x.c/r^2) is the great-circle distance on the sphere
+               of radius r, the same distance is used between centres
+    """
+    dim = structure[0]
+    radii = structure[1]
+    D = np.empty((len(A), len(B), dim + len(radii)))
+    D[:, :, : dim] = A[:, np.newaxis, : dim] - B[np.newaxis, :, : dim]
+    for period in range(len(radii)):
+        r = radii[period]
+        column = dim + (period * 2)
+        a = A[:, column: column + 2] / r
+        b = B[:, column: column + 2] / r
+        height_a = np.sqrt(np.clip(1 - np.sum(a ** 2, axis=1), 0, 1))
+        height_b = np.sqrt(np.clip(1 - np.sum(b ** 2, axis=1), 0, 1))
+        cosine = np.dot(a, b.T) + np.outer(height_a, height_b)
+        D[:, :, dim + period] = r * np.arccos(np.clip(cosine, -1, 1))
+    return np.sqrt(np.sum(D ** 2, axis=2))
+
+
+def distance_matrix(X, C, U, structure, XC=None, workspace=None,
+                    phases=False):
     """
     input: X numpy array nxd, matrix of n d-dimensional observations
            C numpy array kxd, matrix of k d-dimensional cluster centres
-           U numpy array kxn, matrix of weights
+           U numpy array kxn, matrix of weights (not used)
+           XC numpy array kxnxWTF, preallocated buffer for substractions
+                                   (or None)
+           workspace numpy array kxn, preallocated temporary array (or None)
+           phases bool, if True, X and C are in the phase representation
     output: D numpy array kxn, matrix of distances between every observation
             and every center
-    uses: np.shape(), np.tile(), np.array(), np.abs()
+    uses: np.sqrt(), np.sum(),
+          dio.hypertime_differences(), dio.phase_differences()
     objective: to find difference between every observation and every
                center in every dimension
     """
-    k, n = np.shape(U)
-    D = []
-    for cluster in range(k):
-        C_cluster = np.tile(C[cluster, :], (n, 1))
-        XC = dio.hypertime_substraction(X, C_cluster, structure)
-        #XC = X - C_cluster
-        # PROC ????
-        ## L1 metrics
-        #D.append(np.sum(np.abs(XC), axis=1))
-        D.append(np.sqrt(np.sum(XC**2, axis=1)))
-    D = np.array(D)
+    if phases:
+        XC = dio.phase_differences(X, C, structure, XC, workspace)
+    else:
+        XC = dio.hypertime_differences(X, C, structure, XC, workspace)
+    ## L1 metrics
+    #D = np.sum(np.abs(XC), axis=2)
+    D = np.sqrt(np.sum(XC ** 2, axis=2))
     return D
 
 
@@ -150,31 +558,97 @@ def partition_matrix(D, version):
     return U
 
 
-def new_centroids(X, U, k, d, fuzzyfier):
+def new_centroids(X, U, k, d, fuzzyfier, weights=None, structure=None,
+                  phases=False):
     """
     input: U numpy array kxn, matrix of weights
            X numpy array nxd, matrix of n d-dimensional observations
            k positive integer, number of clusters
            d positive integer, number of dimensions
            fuzzyfier number, larger or equal one, not too large, usually 2 or 1
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths (needed for phases)
+           phases bool, if True, X is in the phase representation and
+                        centres of circles are circular means
     output: C numpy array kxd, matrix of k d-dimensional cluster centres
-    uses: np.zeros(), np.tile(), np.sum()
+    uses: np.dot(), np.sum(),
+          circle_coordinates(), from_circle_coordinates()
     objective: calculate new centroids
     """
     U = U ** fuzzyfier
-    C = np.zeros((k, d))
-    for centroid in range(k):
-        U_part = np.tile(U[centroid, :], (d, 1)).T
-        C[centroid, :] = (np.sum(U_part * X, axis=0) / np.sum(U_part, axis=0))
+    if weights is not None:
+        U = U * weights
+    if phases:
+        C = np.dot(U, circle_coordinates(X, structure, phases)) /\
+            np.sum(U, axis=1, keepdims=True)
+        return from_circle_coordinates(C, structure, phases)
+    C = np.dot(U, X) / np.sum(U, axis=1, keepdims=True)
     return C
 
 
-def initialization(X, k, method, C_in, U_in, structure, version):
+def circle_coordinates(X, structure, phases):
+    """
+    input: X numpy array nxd, matrix of observations or centres
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           phases bool, if True, X is in the phase representation
+    output: X numpy array, X in the usual representation (pairs
+                           of coordinates on circles)
+    uses: dio.phases_to_X()
+    objective: to get coordinates, that can be averaged
+    """
+    if phases:
+        return dio.phases_to_X(X, structure)
+    return X
+
+
+def from_circle_coordinates(C, structure, phases):
+    """
+    input: C numpy array kxd, matrix of centres in the usual representation
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           phases bool, if True, the phase representation is requested
+    output: C numpy array, C in the requested representation (means
+                           of circle coordinates become circular means)
+    uses: dio.X_to_phases()
+    objective: inverse of circle_coordinates()
+    """
+    if phases:
+        return dio.X_to_phases(C, structure)
+    return C
+
+
+def centroid_width(d, structure, phases):
+    """
+    input: d positive integer, number of columns of X
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           phases bool, if True, X is in the phase representation
+    output: width positive integer, number of columns of circle_coordinates()
+    uses: len()
+    objective: to allocate sums of circle coordinates
+    """
+    if phases:
+        return d + len(structure[1])
+    return d
+
+
+def initialization(X, k, method, C_in, U_in, structure, version,
+                   weights=None, phases=False):
     """
     input: X numpy array nxd, matrix of n d-dimensional observations
            k positive integer, number of clusters
            method string, defines type of initialization, (possible 'random',
-                                                           'prev_dim')
+                                                           'prev_dim',
+                                                           'stable_init',
+                                                           'plus_plus',
+                                                           'warm_start')
            C_in numpy array kxd, matrix of k d-dimensional cluster centres
                                  from the last iteration
            U_in numpy array kxn, matrix of weights from the last iteration
@@ -183,11 +657,15 @@ def initialization(X, k, method, C_in, U_in, structure, version):
                       radii nad list of wavelengths
            version string, version of making weights (possible 'fuzzy',
                                                       'model', 'hard')
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+           phases bool, if True, X is in the phase representation
     output: C numpy array kxd, matrix of k d-dimensional cluster centres
             U numpy array kxn, matrix of weights
     uses: np.shape(), np.random.choice(), np.arange(), np.random.randn(),
           np.shape(), np.empty(), np.c_[], np.cos(), np.sin(), np.zeros()
-          distance_matrix(), partition_matrix()
+          distance_matrix(), partition_matrix(), plus_plus_centres(),
+          warm_start_centres()
     objective: create initial centroids and weights
     """
     if method == 'random':
@@ -199,8 +677,17 @@ def initialization(X, k, method, C_in, U_in, structure, version):
             #print('k: ' + str(k))
             C = X[np.random.choice(np.arange(n), size=k, replace=False), :]
             U = np.random.rand(k, n)
-            D = distance_matrix(X, C, U, structure)
+            D = distance_matrix(X, C, U, structure, phases=phases)
             U = partition_matrix(D, version)
+    elif method == 'plus_plus':
+        C = plus_plus_centres(X, k, structure, weights=weights, phases=phases)
+        D = distance_matrix(X, C, None, structure, phases=phases)
+        U = partition_matrix(D, version)
+    elif method == 'warm_start':
+        C = warm_start_centres(X, k, C_in, U_in, structure,
+                               weights=weights, phases=phases)
+        D = distance_matrix(X, C, None, structure, phases=phases)
+        U = partition_matrix(D, version)
     elif method == 'prev_dim':
         # supposing that the algorith adds only one circle per iteration
         d = np.shape(X)[1]
@@ -217,10 +704,145 @@ def initialization(X, k, method, C_in, U_in, structure, version):
         U = np.empty_like(U_in)
         np.copyto(U, U_in)
     elif method == 'stable_init':
-        C = new_centroids(X, U_in, k, d=np.shape(X)[1], fuzzyfier=1)
+        C = new_centroids(X, U_in, k, d=np.shape(X)[1], fuzzyfier=1,
+                          weights=weights, structure=structure, phases=phases)
         U = np.empty_like(U_in)
         np.copyto(U, U_in)
     else:
         print('unknown method of initialization, returning zeros!')
         C = np.zeros((k, d))
     return C, U
+
+
+def plus_plus_centres(X, k, structure, block_size=0, C_known=None,
+                      weights=None, phases=False):
+    """
+    input: X numpy array nxd, matrix of n d-dimensional observations
+           k positive integer, number of clusters
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           block_size int, if positive, distances are computed in blocks
+                           of block_size observations
+           C_known numpy array lxd, l < k, centres that are kept, only
+                                   the remaining centres are chosen (or None)
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+           phases bool, if True, X is in the phase representation
+    output: C numpy array kxd, matrix of k d-dimensional cluster centres
+    uses: np.shape(), np.empty(), np.random.randint(), np.random.choice(),
+          np.sum(), np.min(), np.minimum(),
+          distance_matrix()
+    objective: to choose initial centres by k-means++ (D^2 weighting) using
+               the hypertime distances (arcs on circles)
+    """
+    n, d = np.shape(X)
+    if block_size <= 0:
+        block_size = n
+    C = np.empty((k, d))
+    if C_known is None or len(C_known) == 0:
+        if weights is None:
+            C[0] = X[np.random.randint(n)]
+        else:
+            C[0] = X[np.random.choice(n, p=weights / np.sum(weights))]
+        known = 1
+    else:
+        known = len(C_known)
+        C[: known] = C_known
+    if known == k:
+        return C
+    closest = np.empty(n)
+    for start in range(0, n, block_size):
+        D = distance_matrix(X[start: start + block_size], C[: known], None,
+                            structure, phases=phases)
+        closest[start: start + block_size] = np.min(D, axis=0) ** 2
+    for centre in range(known, k):
+        if weights is None:
+            probabilities = closest
+        else:
+            probabilities = closest * weights
+        total = np.sum(probabilities)
+        if total > 0:
+            chosen = np.random.choice(n, p=probabilities / total)
+        else:  # less distinct points than clusters
+            chosen = np.random.randint(n)
+        C[centre] = X[chosen]
+        if centre == k - 1:
+            break
+        for start in range(0, n, block_size):
+            D = distance_matrix(X[start: start + block_size],
+                                C[centre: centre + 1], None, structure,
+                                phases=phases)
+            np.minimum(closest[start: start + block_size], D[0] ** 2,
+                       out=closest[start: start + block_size])
+    return C
+
+
+def warm_start_centres(X, k, C_in, U_in, structure, block_size=0,
+                       weights=None, phases=False):
+    """
+    input: X numpy array nxd, matrix of n d-dimensional observations
+           k positive integer, number of clusters
+           C_in numpy array lxe, e <= d, matrix of l e-dimensional cluster
+                                         centres from the last iteration
+           U_in numpy array lxn, matrix of weights from the last iteration
+                                 (or None if it was not kept)
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           block_size int, if positive, X is processed in blocks
+                           of block_size observations
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+           phases bool, if True, X and C_in are in the phase representation
+    output: C numpy array kxd, matrix of k d-dimensional cluster centres
+    uses: np.shape(), np.sum(), np.dot(), np.zeros(), np.argsort(),
+          distance_matrix(), partition_matrix(), plus_plus_centres(),
+          circle_coordinates(), from_circle_coordinates(), centroid_width()
+    objective: to lift centres of the last iteration into the space of X,
+               centres are recomputed as weighted means of X using weights
+               of the last iteration, so the known coordinates are kept and
+               the added hypertime circles get the mean of cluster members;
+               if weights were not kept, X is partitioned by C_in in the
+               space of the last iteration (first e columns of X);
+               empty and surplus (least dense) clusters are dropped,
+               missing centres are added by k-means++
+    """
+    n, d = np.shape(X)
+    d_in = np.shape(C_in)[1]
+    if U_in is not None and np.shape(U_in)[1] == n:
+        if weights is not None:
+            U_in = U_in * weights
+        weighted_sums = np.dot(U_in, circle_coordinates(X, structure,
+                                                        phases))
+        sums_of_weights = np.sum(U_in, axis=1, keepdims=True)
+    else:
+        if block_size <= 0:
+            block_size = n
+        if phases:
+            circles = d_in - structure[0]
+        else:
+            circles = (d_in - structure[0]) // 2
+        last_structure = [structure[0], structure[1][: circles],
+                          structure[2][: circles]]
+        weighted_sums = np.zeros((len(C_in), centroid_width(d, structure,
+                                                            phases)))
+        sums_of_weights = np.zeros((len(C_in), 1))
+        for start in range(0, n, block_size):
+            X_block = X[start: start + block_size]
+            D = distance_matrix(X_block[:, : d_in], C_in, None,
+                                last_structure, phases=phases)
+            U = partition_matrix(D, 'hard')
+            if weights is not None:
+                U = U * weights[start: start + block_size]
+            weighted_sums += np.dot(U, circle_coordinates(X_block, structure,
+                                                          phases))
+            sums_of_weights += np.sum(U, axis=1, keepdims=True)
+    order = np.argsort(-sums_of_weights[:, 0], kind='mergesort')
+    order = order[sums_of_weights[order, 0] > 0][: k]
+    C = from_circle_coordinates(weighted_sums[order] / sums_of_weights[order],
+                                structure, phases)
+    if len(C) < k:
+        C = plus_plus_centres(X, k, structure, block_size, C_known=C,
+                              weights=weights, phases=phases)
+    return C
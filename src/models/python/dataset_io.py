@@ -26,12 +26,49 @@ input: data numpy array nxd*, matrix of measures IRL, where d* is number
                       radii nad list of wavelengths
 and
 output: X numpy array nxd, matrix of measures in hypertime
+
+create_phases(data, structure): the same as create_X(), but every circle is
+                                represented by one phase (radii are kept in
+                                structure), phases_to_X() and X_to_phases()
+                                convert between both representations and
+                                phase_differences() substracts centres
+                                without goniometric functions
+
+projection(data, structure, phases): the same as create_X() or
+                                     create_phases(), but projections are
+                                     cached and extended by added periods
+                                     only, clear_projections() releases them
+                                     and set_projection_limit() sets their
+                                     memory
+
+phase_classes(input_coordinates, structure, resolution): classes of rows
+                                                         of a grid projected
+                                                         onto the same
+                                                         positions in
+                                                         hypertime
 """
 
 import pandas as pd
 import numpy as np
 import pickle
 import os
+import threading
+from collections import OrderedDict
+
+
+# projections of data into hypertime reused by projection(), the limit is in
+# bytes (default of set_projection_limit()), projected data must not
+# be changed in place while they are cached
+PROJECTION_CACHE_LIMIT = int(2.5e8)
+_projections = OrderedDict()
+_projections_size = [0]
+_projections_limit = [PROJECTION_CACHE_LIMIT]
+# grid parts can be projected in parallel threads (see model.py)
+_projections_lock = threading.Lock()
+# classes of cells of grids from phase_classes(), the same grid is evaluated
+# by every model, the limit is in number of grids
+PHASE_CLASSES_LIMIT = 4
+_phase_classes = OrderedDict()
 
 
 def loading_data(path):
@@ -108,6 +145,351 @@ def create_X(data, structure):
     return X
 
 
+def collapse_points(X, tolerance=0.0):
+    """
+    input: X numpy array nxd, matrix of measures in hypertime
+           tolerance float, edge of cells of quantisation, zero for exact
+                            duplicates only
+    output: X numpy array mxd, m <= n, matrix of distinct measures
+                                       in hypertime
+            weights numpy array m, numbers of original measures represented
+                                   by every row of the new X
+    uses: np.round(), np.unique(), np.bincount(), np.empty(), np.shape()
+    objective: to collapse measures, that are projected onto the same
+               (or the same up to the tolerance) positions in hypertime,
+               into weighted measures; exact duplicates are represented by
+               themselves, measures from one cell of quantisation by their
+               mean
+    """
+    if tolerance > 0:
+        keys = np.round(X / tolerance)
+    else:
+        keys = X
+    unique_keys, first, inverse, counts = np.unique(keys, axis=0,
+                                                    return_index=True,
+                                                    return_inverse=True,
+                                                    return_counts=True)
+    inverse = inverse.reshape(-1)
+    m = len(first)
+    if tolerance > 0:
+        collapsed = np.empty((m, np.shape(X)[1]))
+        for column in range(np.shape(X)[1]):
+            collapsed[:, column] = np.bincount(inverse, weights=X[:, column],
+                                               minlength=m) / counts
+    else:
+        collapsed = X[first]
+    return collapsed, counts.astype(float)
+
+
+def phase_classes(input_coordinates, structure, resolution=0.0,
+                  cache=True):
+    """
+    input: input_coordinates numpy array nxd*, positions IRL (time in the
+                                               first column)
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           resolution float, width of bins of phases in the units of time,
+                             zero for exactly equal phases only
+           cache bool, if False, classes are neither looked up nor stored
+                       (grids created for one use, the cache would keep
+                       them alive)
+    output: representatives numpy array mxd*, one row of input_coordinates
+                                              for every class (read-only)
+            inverse numpy array n, class of every row
+            counts numpy array m, numbers of rows in the classes
+    uses: np.unique(), np.column_stack(), np.ndarray.setflags(),
+          time_classes(), unique_rows()
+    objective: to find rows of the grid with the same phase on every period
+               (up to the resolution) and the same other coordinates, they
+               are projected onto the same position in hypertime, so every
+               class of rows can be evaluated once; phases are found for
+               distinct times only (time frames are repeated in grids);
+               classes are cached for the memory of input_coordinates and
+               the structure, so the same representatives (and their
+               cached projections) are used by all models
+    """
+    dim = structure[0]
+    wavelengths = structure[2]
+    interface = input_coordinates.__array_interface__
+    key = (interface['data'][0], np.shape(input_coordinates),
+           interface['strides'], dim, tuple(wavelengths), resolution)
+    if cache:
+        with _projections_lock:
+            entry = _phase_classes.pop(key, None)
+            if entry is not None:
+                _phase_classes[key] = entry
+                return entry[1:]
+    times, time_inverse = np.unique(input_coordinates[:, 0],
+                                    return_inverse=True)
+    classes_of_times = time_classes(times, wavelengths, resolution)[1]
+    row_classes = classes_of_times[time_inverse.reshape(-1)]
+    first, inverse, counts =\
+        unique_rows(np.column_stack((row_classes,
+                                     input_coordinates[:, 1: dim + 1])))
+    representatives = input_coordinates[first]
+    representatives.setflags(write=False)
+    # input_coordinates are kept, so their memory is not reused by others
+    entry = (input_coordinates, representatives, inverse,
+             counts.astype(float))
+    if cache:
+        with _projections_lock:
+            _phase_classes[key] = entry
+            while len(_phase_classes) > PHASE_CLASSES_LIMIT:
+                _phase_classes.popitem(last=False)
+    return entry[1:]
+
+
+def time_classes(times, wavelengths, resolution=0.0):
+    """
+    input: times numpy array n, times
+           wavelengths list(floats), wavelengths of periods
+           resolution float, width of bins of phases in the units of time,
+                             zero for exactly equal phases only
+    output: first numpy array m, index of the first time of every class
+            inverse numpy array n, class of every time
+            counts numpy array m, numbers of times in the classes
+    uses: np.mod(), np.floor(), np.empty(), unique_rows()
+    objective: to find times with the same phase on every period (up
+               to the resolution)
+    """
+    keys = np.empty((len(times), len(wavelengths)))
+    for period in range(len(wavelengths)):
+        phases = np.mod(times, wavelengths[period])
+        if resolution > 0:
+            keys[:, period] = np.floor(phases / resolution)
+        else:
+            keys[:, period] = phases
+    return unique_rows(keys)
+
+
+def unique_rows(keys):
+    """
+    input: keys numpy array nxd, matrix of n rows
+    output: first numpy array m, indices of the first occurences of distinct
+                                 rows
+            inverse numpy array n, index of the distinct row for every row
+            counts numpy array m, numbers of occurences of distinct rows
+    uses: np.lexsort(), np.empty(), np.any(), np.cumsum(), np.flatnonzero(),
+          np.diff()
+    objective: to find distinct rows like np.unique(keys, axis=0), but
+               the rows are sorted by np.lexsort() (much faster than sorting
+               rows as single items), the order of distinct rows is
+               the lexicographic order from the last column
+    """
+    n = np.shape(keys)[0]
+    order = np.lexsort(keys.T)
+    sorted_keys = keys[order]
+    starts = np.empty(n, dtype=bool)
+    starts[: 1] = True
+    starts[1:] = np.any(sorted_keys[1:] != sorted_keys[: -1], axis=1)
+    inverse = np.empty(n, dtype=np.int64)
+    inverse[order] = np.cumsum(starts) - 1
+    positions = np.flatnonzero(starts)
+    # the sort is stable, the first of equal rows is the first occurence
+    first = order[positions]
+    counts = np.diff(np.append(positions, n))
+    return first, inverse, counts
+
+
+def create_phases(data, structure):
+    """
+    input: data numpy array nxd*, matrix of measures IRL, where d* is number
+                                  of measured variables
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+    output: X numpy array nxWTF, matrix of measures in hypertime, where every
+                                 circle is represented by one phase
+                                 in [0, 2pi)
+    uses: np.empty(), np.floor(), np.multiply()
+    objective: to create X as a data in hypertime in the compact (phase)
+               representation, radii are kept in structure only
+    """
+    dim = structure[0]
+    wavelengths = structure[2]
+    X = np.empty((len(data), dim + len(wavelengths)))
+    X[:, : dim] = data[:, 1: dim + 1]
+    for period in range(len(wavelengths)):
+        # fractional part of the number of cycles
+        cycles = data[:, 0] / wavelengths[period]
+        cycles -= np.floor(cycles)
+        np.multiply(cycles, 2 * np.pi, out=X[:, dim + period])
+    return X
+
+
+def phases_to_X(X, structure):
+    """
+    input: X numpy array nxWTF, matrix of measures in hypertime (phases)
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+    output: X numpy array nxd, matrix of measures in hypertime (pairs of
+                               coordinates on circles, as create_X())
+    uses: np.empty(), np.cos(), np.sin(), np.shape()
+    objective: to convert the phase representation into the usual one
+    """
+    dim = structure[0]
+    radii = structure[1]
+    periods = np.shape(X)[1] - dim
+    out = np.empty((len(X), dim + periods * 2))
+    out[:, : dim] = X[:, : dim]
+    for period in range(periods):
+        r = radii[period]
+        column = dim + (period * 2)
+        out[:, column] = r * np.cos(X[:, dim + period])
+        out[:, column + 1] = r * np.sin(X[:, dim + period])
+    return out
+
+
+def X_to_phases(X, structure):
+    """
+    input: X numpy array nxd, matrix of measures in hypertime (pairs of
+                              coordinates on circles, as create_X())
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+    output: X numpy array nxWTF, matrix of measures in hypertime (phases)
+    uses: np.empty(), np.arctan2(), np.mod(), np.shape()
+    objective: to convert the usual representation into the phase one,
+               points inside circles (centres) are projected onto them
+    """
+    dim = structure[0]
+    periods = (np.shape(X)[1] - dim) // 2
+    out = np.empty((len(X), dim + periods))
+    out[:, : dim] = X[:, : dim]
+    for period in range(periods):
+        column = dim + (period * 2)
+        out[:, dim + period] = np.mod(np.arctan2(X[:, column + 1],
+                                                 X[:, column]), 2 * np.pi)
+    return out
+
+
+def projection(data, structure, phases=False, cache=True):
+    """
+    input: data numpy array nxd*, matrix of measures IRL, where d* is number
+                                  of measured variables
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           phases bool, if True, the phase representation is created
+           cache bool, if False, data are projected without the cache
+                       (data generated for one use only)
+    output: X numpy array nxd, matrix of measures in hypertime (read-only),
+                               the same as create_X() or create_phases()
+    uses: np.shape(), np.empty(),
+          create_X(), create_phases(), cache_projection()
+    objective: to project data into hypertime only once, projections are
+               cached for the memory of data (views of the same part
+               of an array share it) and for the structure, if the structure
+               differs only by added periods, only their columns are
+               computed, if it is a prefix of the cached one, the cached
+               columns are returned
+    """
+    if not cache:
+        if phases:
+            return create_phases(data, structure)
+        return create_X(data, structure)
+    interface = data.__array_interface__
+    key = (interface['data'][0], np.shape(data), interface['strides'],
+           phases)
+    dim = structure[0]
+    periods = list(zip(structure[1], structure[2]))
+    if phases:
+        columns_per_period = 1
+    else:
+        columns_per_period = 2
+    with _projections_lock:
+        entry = _projections.pop(key, None)
+        if entry is not None:
+            _projections_size[0] -= entry[3].nbytes
+    if entry is not None:
+        cached_data, cached_dim, cached_periods, X = entry
+        if cached_dim == dim and\
+                cached_periods[: len(periods)] == periods:
+            cache_projection(key, entry)
+            return X[:, : dim + len(periods) * columns_per_period]
+        if cached_dim == dim and\
+                periods[: len(cached_periods)] == cached_periods:
+            added = [dim, [r for r, wavelength in
+                           periods[len(cached_periods):]],
+                     [wavelength for r, wavelength in
+                      periods[len(cached_periods):]]]
+            if phases:
+                new_columns = create_phases(data, added)
+            else:
+                new_columns = create_X(data, added)
+            width = np.shape(X)[1]
+            X_new = np.empty((len(data), width + np.shape(new_columns)[1] -
+                              dim))
+            X_new[:, : width] = X
+            X_new[:, width:] = new_columns[:, dim:]
+            cache_projection(key, (data, dim, periods, X_new))
+            return X_new
+    if phases:
+        X = create_phases(data, structure)
+    else:
+        X = create_X(data, structure)
+    cache_projection(key, (data, dim, periods, X))
+    return X
+
+
+def cache_projection(key, entry):
+    """
+    input: key tuple, address, shape and strides of data and representation
+           entry tuple, data, number of non-hypertime dimensions, list
+                        of pairs (radius, wavelength) and projected data
+    output: None
+    uses: np.ndarray.setflags(), _projections.popitem()
+    objective: to store the projection as the most recently used one and
+               to forget the least recently used ones over the limit
+               of set_projection_limit()
+    """
+    X = entry[3]
+    if X.nbytes > _projections_limit[0]:
+        return
+    X.setflags(write=False)
+    with _projections_lock:
+        _projections[key] = entry
+        _projections_size[0] += X.nbytes
+        while _projections_size[0] > _projections_limit[0]:
+            forgotten = _projections.popitem(last=False)[1]
+            _projections_size[0] -= forgotten[3].nbytes
+
+
+def set_projection_limit(limit=None):
+    """
+    input: limit int, bytes of projections kept by projection() (None for
+                      PROJECTION_CACHE_LIMIT, 0 for no cache)
+    output: None
+    uses: _projections.popitem()
+    objective: to set the memory of cached projections (it is not a part
+               of 'memory_budget' of the evaluation), the least recently
+               used projections over the new limit are forgotten
+    """
+    if limit is None:
+        limit = PROJECTION_CACHE_LIMIT
+    with _projections_lock:
+        _projections_limit[0] = limit
+        while _projections_size[0] > limit:
+            forgotten = _projections.popitem(last=False)[1]
+            _projections_size[0] -= forgotten[3].nbytes
+
+
+def clear_projections():
+    """
+    input: None
+    output: None
+    uses: _projections.clear(), _phase_classes.clear()
+    objective: to release all cached projections and classes
+               of phase_classes() (and data referenced by them)
+    """
+    with _projections_lock:
+        _projections.clear()
+        _projections_size[0] = 0
+        _phase_classes.clear()
+
+
 def file_directory():
     """
     it is needed to call the file for '__file__' to be defined :)
@@ -173,6 +555,125 @@ def hypertime_substraction(X, Ci, structure):
     return XC
 
 
+def hypertime_differences(X, C, structure, out=None, workspace=None):
+    """
+    input: X numpy array nxd, matrix of n d-dimensional observations
+           C numpy array kxd, matrix of k d-dimensional cluster centres
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           out numpy array kxnxWTF, preallocated output (or None)
+           workspace numpy array kxn, preallocated temporary array (or None)
+    output: XC numpy array kxnxWTF, matrix of n WTF-dimensional substractions
+                                    for every one of k centres
+    uses: np.empty(), np.subtract(), np.multiply.outer(), np.clip(),
+          np.arccos(), np.multiply()
+    objective: to substract all centres from X in hypertime at once,
+               the same as hypertime_substraction() for every centre, but
+               without copies of centres and with reusable buffers
+    """
+    n = np.shape(X)[0]
+    k = np.shape(C)[0]
+    dim = structure[0]
+    radii = structure[1]
+    if out is None:
+        out = np.empty((k, n, dim + len(radii)))
+    if workspace is None and len(radii) > 0:
+        workspace = np.empty((k, n))
+    # non-hypertime dimensions substraction
+    np.subtract(X[np.newaxis, :, : dim], C[:, np.newaxis, : dim],
+                out=out[:, :, : dim])
+    # hypertime dimensions substraction
+    for period in range(len(radii)):
+        r = radii[period]
+        column = dim + (period * 2)
+        # the same order of operations as in hypertime_substraction()
+        np.multiply.outer(C[:, column], X[:, column], out=workspace)
+        workspace += np.multiply.outer(C[:, column + 1], X[:, column + 1])
+        workspace /= (r ** 2)
+        np.clip(workspace, -1, 1, out=workspace)
+        np.arccos(workspace, out=workspace)
+        np.multiply(workspace, r, out=out[:, :, dim + period])
+    return out
+
+
+def hypertime_pair_differences(X, C, structure):
+    """
+    input: X numpy array nxd, matrix of n d-dimensional observations
+           C numpy array nxd, matrix of centres, one for every observation
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+    output: XC numpy array nxWTF, matrix of n WTF-dimensional substractions
+                                  of every observation and its centre
+    uses: np.empty(), np.subtract(), np.multiply(), np.clip(), np.arccos()
+    objective: to substract i-th centre from i-th observation in hypertime,
+               the same operations (in the same order) as in
+               hypertime_differences(), so the results are equal to
+               the corresponding elements of its output
+    """
+    n = np.shape(X)[0]
+    dim = structure[0]
+    radii = structure[1]
+    out = np.empty((n, dim + len(radii)))
+    workspace = np.empty(n)
+    # non-hypertime dimensions substraction
+    np.subtract(X[:, : dim], C[:, : dim], out=out[:, : dim])
+    # hypertime dimensions substraction
+    for period in range(len(radii)):
+        r = radii[period]
+        column = dim + (period * 2)
+        np.multiply(C[:, column], X[:, column], out=workspace)
+        workspace += C[:, column + 1] * X[:, column + 1]
+        workspace /= (r ** 2)
+        np.clip(workspace, -1, 1, out=workspace)
+        np.arccos(workspace, out=workspace)
+        np.multiply(workspace, r, out=out[:, dim + period])
+    return out
+
+
+def phase_differences(X, C, structure, out=None, workspace=None):
+    """
+    input: X numpy array nxWTF, matrix of n observations (phases)
+           C numpy array kxWTF, matrix of k cluster centres (phases)
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           out numpy array kxnxWTF, preallocated output (or None)
+           workspace numpy array kxn, preallocated temporary array (or None)
+    output: XC numpy array kxnxWTF, matrix of n WTF-dimensional substractions
+                                    for every one of k centres
+    uses: np.empty(), np.subtract(), np.abs(), np.multiply()
+    objective: to substract all centres from X in the phase representation,
+               the hypertime substraction is the length of the shorter arc
+               between phases, pi - |pi - |phase - phase_of_centre||,
+               (the same as hypertime_differences() gives for centres lying
+               on circles), no goniometric functions are needed
+    """
+    n = np.shape(X)[0]
+    k = np.shape(C)[0]
+    dim = structure[0]
+    radii = structure[1]
+    if out is None:
+        out = np.empty((k, n, dim + len(radii)))
+    if workspace is None and len(radii) > 0:
+        workspace = np.empty((k, n))
+    # non-hypertime dimensions substraction
+    np.subtract(X[np.newaxis, :, : dim], C[:, np.newaxis, : dim],
+                out=out[:, :, : dim])
+    # hypertime dimensions substraction
+    for period in range(len(radii)):
+        column = dim + period
+        np.subtract(X[np.newaxis, :, column], C[:, np.newaxis, column],
+                    out=workspace)
+        np.abs(workspace, out=workspace)
+        workspace -= np.pi
+        np.abs(workspace, out=workspace)
+        np.subtract(np.pi, workspace, out=workspace)
+        np.multiply(workspace, radii[period], out=out[:, :, column])
+    return out
+
+
 # next there are functions used for testing only
 def save_numpy_array(variable, name, save_directory):
     """
@@ -1,16 +1,22 @@
 import numpy as np
 import model as mdl
 import grid
+import dataset_io as dio
 
 
 def evaluation_step(evaluation_dataset, C, COV, density_integrals,\
-                    structure, k, edges_of_cell):
+                    structure, k, edges_of_cell, options=None):
     """
     """
+    if options is not None and options.get('lazy_grid', False):
+        return lazy_evaluation_step(evaluation_dataset, C, COV,
+                                    density_integrals, structure, k,
+                                    edges_of_cell, options)
     evaluation_data = evaluation_dataset[evaluation_dataset[:, -1] == 1, 0: -1]
     freqs, input_coordinates, extended_shape_of_grid, valid_timesteps =\
         params_for_model(evaluation_dataset, C, COV, density_integrals,\
-                         structure, k, edges_of_cell, evaluation_data)
+                         structure, k, edges_of_cell, evaluation_data,
+                         options)
     model = np.histogramdd(input_coordinates,\
                            bins=extended_shape_of_grid[0],
                            range=extended_shape_of_grid[1],\
@@ -33,9 +39,67 @@ def evaluation_step(evaluation_dataset, C, COV, density_integrals,\
     return diff
 
 
+def lazy_evaluation_step(evaluation_dataset, C, COV, density_integrals,
+                         structure, k, edges_of_cell, options):
+    """
+    input: evaluation_dataset numpy array nxd+1, measures with the measured
+                                                 values in the last column
+           C numpy array kxd, matrix of k d-dimensional cluster centres
+           COV numpy array kxdxd, matrix of covariance matrices
+           density_integrals numpy array kx1, matrix of ratios between
+                                              measurements and grid cells
+                                              belonging to the clusters
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           k positive integer, number of clusters
+           edges_of_cell list(floats), edges of cells in every dimension
+           options dict, optional settings of learning (see learning.py),
+                         'memory_budget', 'threads' and
+                         'phase_resolution' are used here
+    output: diff float, the same difference between model and evaluation
+                        data as evaluation_step() without 'lazy_grid'
+    uses: grid.time_space_positions(), grid.LazyGrid.restricted(),
+          grid.LazyGrid.phase_classes(), grid.LazyGrid.rows_of(),
+          mdl.frequencies(), np.unique(), np.sum()
+    objective: to compare the model with evaluation data without grids
+               over time-space, the model is evaluated on valid timeframes
+               only (timeframes with the same phases once), measured values
+               are counted in occupied cells only and the squares
+               of differences in the other cells are squares of the model
+    """
+    evaluation_data = evaluation_dataset[evaluation_dataset[:, -1] == 1, 0: -1]
+    input_coordinates, time_frame_sums, overall_sum,\
+        extended_shape_of_grid, T, valid_timesteps =\
+        grid.time_space_positions(edges_of_cell, evaluation_data,
+                                  evaluation_dataset, lazy=True)
+    valid_grid = input_coordinates.restricted(valid_timesteps)
+    cells_of_frame = valid_grid.cells_of_frame
+    resolution = options.get('phase_resolution', None)
+    if resolution is None:
+        grid_coordinates = valid_grid
+        frame_inverse = np.arange(len(valid_grid.frames))
+        frame_counts = np.ones(len(valid_grid.frames))
+    else:  # timeframes with the same phases are evaluated once
+        grid_coordinates, frame_inverse, frame_counts =\
+            valid_grid.phase_classes(structure, resolution)
+    freqs = mdl.frequencies(grid_coordinates, C, COV,
+                            structure, k, density_integrals,
+                            memory_budget=options.get('memory_budget'),
+                            threads=options.get('threads'))
+    freqs = freqs.reshape(-1, cells_of_frame)
+    rows, inside = valid_grid.rows_of(evaluation_data)
+    occupied, reality = np.unique(rows[inside], return_counts=True)
+    frames = occupied // cells_of_frame
+    model = freqs[frame_inverse[frames], occupied % cells_of_frame]
+    squares = np.sum(frame_counts * np.sum(freqs ** 2, axis=1)) -\
+        np.sum(model ** 2) + np.sum((reality - model) ** 2)
+    return max(squares, 0.0) ** 0.5
+
 
 def params_for_model(evaluation_dataset, C, COV, density_integrals,
-                     structure, k, edges_of_cell, evaluation_data):
+                     structure, k, edges_of_cell, evaluation_data,
+                     options=None):
     """
     input: path string, path to file
            C numpy array kxd, matrix of k d-dimensional cluster centres
@@ -49,6 +113,9 @@ def params_for_model(evaluation_dataset, C, COV, density_integrals,
            k positive integer, number of clusters
            edge_of_square float, spatial edge of cell in default units (meters) 
            timestep float, time edge of cell in default units (seconds)
+           options dict, optional settings of learning (see learning.py),
+                         'memory_budget', 'threads' and
+                         'phase_resolution' are used here
     output: freqs numpy array len(input_coordinates_part)x1,
                                            frequencies(stat) obtained
                                            from model in positions
@@ -56,7 +123,8 @@ def params_for_model(evaluation_dataset, C, COV, density_integrals,
             input_coordinates numpy array, coordinates for model creation
             shape_of_grid numpy array dx1 int64, number of cells in every
                                                  dimension
-    uses: grid.time_space_positions(), mdl.frequencies()
+    uses: grid.time_space_positions(), dio.phase_classes(),
+          mdl.frequencies()
     objective: to return frequencies (stat) on coordinates in the chosen grid
     """
     evaluation_data = evaluation_dataset[evaluation_dataset[:, -1] == 1, 0: -1]
@@ -64,6 +132,21 @@ def params_for_model(evaluation_dataset, C, COV, density_integrals,
         extended_shape_of_grid, T, valid_timesteps =\
         grid.time_space_positions(edges_of_cell, evaluation_data,
                                   evaluation_dataset)
-    freqs = mdl.frequencies(input_coordinates, C, COV,
-                            structure, k, density_integrals)
+    if options is None:
+        options = {}
+    resolution = options.get('phase_resolution', None)
+    if resolution is None:
+        grid_coordinates = input_coordinates
+    else:  # cells with the same phases are evaluated once
+        # the grid is created for this evaluation only, it is not cached
+        grid_coordinates, inverse, counts =\
+            dio.phase_classes(input_coordinates, structure, resolution,
+                              cache=False)
+    # projections of the grid are not reused, they are not cached
+    freqs = mdl.frequencies(grid_coordinates, C, COV,
+                            structure, k, density_integrals,
+                            memory_budget=options.get('memory_budget'),
+                            threads=options.get('threads'), cache=False)
+    if resolution is not None:
+        freqs = freqs[inverse]
     return freqs, input_coordinates, extended_shape_of_grid, valid_timesteps
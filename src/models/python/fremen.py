@@ -37,13 +37,53 @@ shortest - float, legth of the shortest wanted period in default units,
          - usualy one hour.
 It is necessary to understand what periodicities you are looking for (or what
     periodicities you think are the most influential)
+build_frequencies(longest, shortest, coarseness) creates only every
+coarseness-th frequency, and chosen_period(..., peaks, tolerance) then refines
+the strongest peaks of this coarse spectrum by golden-section search (to
+the precision tolerance, relative to the spacing of the coarse grid), so
+the found period does not have to lie on the grid (e.g. one day with a drift)
+
+the spectrum is computed in blocks over frequencies and times, so that
+the temporary complex matrices never exceed SPECTRUM_MEMORY_LIMIT bytes
+(peak memory does not grow with the length of the training history)
+
+as T and the (only shrinking) W are the same during the whole learning, it is
+possible to call
+build_basis(T, W):
+once per dataset and pass its output (basis) to every chosen_period() call,
+the spectrum is then only a product of the stored phasors and the residues
+
+if T are equally spaced (possibly with gaps, as the centres of valid timeframes
+from grid.time_space_positions()) and frequencies W are equally spaced
+(possibly with gaps, as the output of build_frequencies() without chosen
+frequencies), the spectrum is computed by the chirp-z transform
+of the zero-filled residues (O((N + L) log(N + L)) instead of O(L N)),
+irregular data use the exact computation
+
+for the append-only observations (measurements added continuously), call
+build_accumulator(W):
+once, then
+accumulate(accumulator, times, residues):
+with every new batch of observations (or timeframe sums) - it costs O(L) per
+observation - and
+accumulated_period(accumulator, W, ES):
+to choose the most influential period without rescanning of the history,
+the output is the same as the output of chosen_period()
 """
 
 import numpy as np
 
 
+# upper bound (in bytes) of temporary arrays used by complex_numbers_batch()
+SPECTRUM_MEMORY_LIMIT = int(1e8)
+# upper bound (in bytes) of the phasor matrix stored by build_basis()
+BASIS_MEMORY_LIMIT = int(5e8)
+# relative tolerance for the detection of uniformly sampled time positions
+UNIFORM_TOLERANCE = 1e-6
+
+
 def chosen_period(T, time_frame_sums, time_frame_freqs, W, ES,
-                  valid_timesteps):
+                  valid_timesteps, basis=None, peaks=0, tolerance=1e-3):
     """
     input: T numpy array Nx1, time positions of measured values
            time_frame_sums numpy array shape_of_grid[0]x1, sum of measures
@@ -56,6 +96,15 @@ def chosen_period(T, time_frame_sums, time_frame_freqs, W, ES,
            W numpy array Lx1, sequence of reasonable frequencies
            ES float64, squared sum of squares of residues from the last
                        iteration
+           valid_timesteps numpy array shape_of_grid[0]x1 bool, timeframes
+                                                                with
+                                                                measurements
+           basis list, output of build_basis(T, W_0), where W is a subset
+                       of W_0, or None (no precomputed phasors)
+           peaks int, number of the strongest peaks of the spectrum refined
+                      by refined_period(), zero for no refinement
+           tolerance float, precision of the refinement relative to
+                            the spacing of W
     output: P float64, length of the most influential frequency in default
             units
             W numpy array Lx1, sequence of reasonable frequencies without
@@ -64,7 +113,7 @@ def chosen_period(T, time_frame_sums, time_frame_freqs, W, ES,
                             this iteration
             dES float64, difference between last and new error
     uses: np.sum(), np.max(), np.absolute()
-          complex_numbers_batch(), max_influence()
+          spectrum(), max_influence(), refined_period()
     objective: to choose the most influencing period in the timeseries, where
                timeseries are the residues between reality and model
     """
@@ -77,42 +126,435 @@ def chosen_period(T, time_frame_sums, time_frame_freqs, W, ES,
     else:
         dES = ES_new - ES
         #print('difference in errors: ' + str(dES))
-    G = complex_numbers_batch(T, S, W)
+    G = spectrum(T, S, W, basis)
     P, W = max_influence(W, G)
+    if peaks > 0 and P > 0.0:
+        P = refined_period(T, S, W, G, peaks, tolerance)
     sum_of_amplitudes = np.sum(np.absolute(G))
     return P, W, ES_new, sum_of_amplitudes  # dES
 
 
-def build_frequencies(longest, shortest):
+def build_accumulator(W):
+    """
+    input: W numpy array Lx1, sequence of reasonable frequencies
+    output: accumulator list [W, order, sums, count, energy],
+                             frequencies, their ascending order, numpy array
+                             Lx1 complex of running sums of residues
+                             multiplied by e**(W*t*-2pi*i), number of
+                             accumulated residues and sum of their squares
+    uses: np.array(), np.argsort(), np.zeros()
+    objective: to create empty running spectrum of residues
+    """
+    W = np.array(W, dtype=np.float64)
+    order = np.argsort(W, kind='mergesort')
+    return [W, order, np.zeros(len(W), dtype=np.complex128), 0, 0.0]
+
+
+def accumulate(accumulator, times, residues):
+    """
+    input: accumulator list, output of build_accumulator()
+           times numpy array nx1, time positions of new residues
+           residues numpy array nx1, new residues between reality and model
+                                     (or their sums over timeframes)
+    output: accumulator list, updated running spectrum
+    uses: np.ravel(), np.sum(),
+          complex_numbers_batch()
+    objective: to add new observations to the running spectrum, O(L) work
+               per observation (memory is bounded by SPECTRUM_MEMORY_LIMIT)
+    """
+    times = np.ravel(times)
+    residues = np.ravel(residues)
+    n = len(times)
+    if n == 0:
+        return accumulator
+    accumulator[2] += complex_numbers_batch(times, residues,
+                                            accumulator[0]) * n
+    accumulator[3] += n
+    accumulator[4] += np.sum(residues ** 2)
+    return accumulator
+
+
+def accumulated_period(accumulator, W, ES):
+    """
+    input: accumulator list, output of accumulate()
+           W numpy array Lx1, sequence of reasonable frequencies (subset
+                              of frequencies of the accumulator)
+           ES float64, squared sum of squares of residues from the last
+                       iteration
+    output: P float64, length of the most influential frequency in default
+            units
+            W numpy array Lx1, sequence of reasonable frequencies without
+                               the chosen one
+            ES_new float64, squared sum of squares of residues from
+                            this iteration
+            sum_of_amplitudes float64, sum of absolute values of spectrum
+    uses: np.sum(), np.absolute(),
+          basis_rows(), max_influence()
+    objective: to choose the most influencing period in accumulated
+               residues, the same as chosen_period() over the whole history
+    """
+    ES_new = accumulator[4] ** 0.5
+    rows = basis_rows(accumulator, W)
+    if rows is None:
+        print('frequencies are not part of the accumulator, returning zero')
+        return np.float64(0.0), W, ES_new, np.float64(0.0)
+    G = accumulator[2][rows] / max(accumulator[3], 1)
+    P, W = max_influence(W, G)
+    sum_of_amplitudes = np.sum(np.absolute(G))
+    return P, W, ES_new, sum_of_amplitudes
+
+
+def build_frequencies(longest, shortest, coarseness=1):
     """
     input: longest float, legth of the longest wanted period in default
                           units
            shortest float, legth of the shortest wanted period
                            in default units
+           coarseness int, spacing of frequencies in multiples of 1/longest
     output: W numpy array Lx1, sequence of frequencies
     uses: np.arange()
     objective: to find frequencies w_0 to w_k
     """
-    k = int(longest / shortest) + 1
-    W = np.float64(np.arange(k)) / float(longest)
+    k = int(longest / (shortest * coarseness)) + 1
+    W = np.float64(np.arange(k)) * coarseness / float(longest)
     return W
 
 
-def complex_numbers_batch(T, S, W):
+def refined_period(T, S, W, G, peaks, tolerance):
     """
     input: T numpy array Nx1, time positions of measured values
            S numpy array Nx1, sequence of measured values
+           W numpy array Lx1, sequence of (coarse) frequencies
+           G numpy array Lx1, sequence of complex numbers corresponding
+                              to the frequencies from W
+           peaks int, number of the strongest local maxima to refine
+           tolerance float, precision of the refinement relative to
+                            the spacing of W
+    output: P float64, length of the most influential period in default
+                       units
+    uses: np.absolute(), np.argsort(), np.unique(), np.diff(), np.min(),
+          golden_section()
+    objective: to find the most influential frequency between the grid
+               points, every chosen local maximum of the coarse spectrum is
+               refined inside the interval of one spacing around it
+    """
+    amplitudes = np.absolute(G)
+    unique_W = np.unique(W)
+    if len(unique_W) < 2:
+        return 1 / W[np.argmax(amplitudes)]
+    spacing = np.min(np.diff(unique_W))
+    order = np.argsort(W)
+    sorted_amplitudes = amplitudes[order]
+    maxima = []
+    for i in range(len(order)):
+        if W[order[i]] <= 0:
+            continue
+        left = sorted_amplitudes[i - 1] if i > 0 else -1
+        right = sorted_amplitudes[i + 1] if i < len(order) - 1 else -1
+        if sorted_amplitudes[i] >= left and sorted_amplitudes[i] >= right:
+            maxima.append(order[i])
+    maxima = sorted(maxima, key=lambda position: -amplitudes[position])
+    best_frequency = W[np.argmax(amplitudes)]
+    best_amplitude = np.max(amplitudes)
+    for position in maxima[: peaks]:
+        lower = max(W[position] - spacing, spacing * tolerance)
+        upper = W[position] + spacing
+        frequency, amplitude = golden_section(T, S, lower, upper,
+                                              spacing * tolerance)
+        if amplitude > best_amplitude:
+            best_frequency, best_amplitude = frequency, amplitude
+    return 1 / best_frequency
+
+
+def golden_section(T, S, lower, upper, precision):
+    """
+    input: T numpy array Nx1, time positions of measured values
+           S numpy array Nx1, sequence of measured values
+           lower float, lower bound of the searched frequencies
+           upper float, upper bound of the searched frequencies
+           precision float, width of the final interval
+    output: frequency float64, frequency with the (locally) largest amplitude
+            amplitude float64, amplitude of the spectrum in the frequency
+    uses: np.absolute(), np.array(),
+          complex_numbers_batch()
+    objective: to find the maximum of the amplitude of the spectrum inside
+               the interval by golden-section search, O(N) per step
+    """
+    ratio = (5 ** 0.5 - 1) / 2
+
+    def amplitude_of(frequency):
+        return np.absolute(complex_numbers_batch(T, S,
+                                                 np.array([frequency]))[0])
+
+    a = lower + (1 - ratio) * (upper - lower)
+    b = lower + ratio * (upper - lower)
+    amplitude_a = amplitude_of(a)
+    amplitude_b = amplitude_of(b)
+    while upper - lower > precision:
+        if amplitude_a > amplitude_b:
+            upper, b, amplitude_b = b, a, amplitude_a
+            a = lower + (1 - ratio) * (upper - lower)
+            amplitude_a = amplitude_of(a)
+        else:
+            lower, a, amplitude_a = a, b, amplitude_b
+            b = lower + ratio * (upper - lower)
+            amplitude_b = amplitude_of(b)
+    if amplitude_a > amplitude_b:
+        return a, amplitude_a
+    return b, amplitude_b
+
+
+def remove_period(W, P):
+    """
+    input: W numpy array Lx1, sequence of reasonable frequencies
+           P float64, length of the chosen period in default units
+                      (zero for the frequency zero)
+    output: W numpy array Lx1, sequence of reasonable frequencies without
+                               the one closest to 1/P
+    uses: np.argmin(), np.abs(), np.delete()
+    objective: to remove the chosen periodicity from the frequencies, also
+               if it was refined between the grid points
+    """
+    if P == 0:
+        return W[W != 0]
+    if len(W) == 0:
+        return W
+    return np.delete(W, np.argmin(np.abs(W - 1 / P)))
+
+
+def build_basis(T, W, memory_limit=BASIS_MEMORY_LIMIT):
+    """
+    input: T numpy array Nx1, time positions of measured values
+           W numpy array Lx1, sequence of reasonable frequencies
+           memory_limit int, upper bound (in bytes) of the stored phasors
+    output: basis list [W, order, E], frequencies of the basis, their
+                                      ascending order and numpy array LxN
+                                      of phasors e**(W*T*-2pi*i) / N
+                                      (E is None, if it does not fit into
+                                      memory_limit)
+    uses: np.argsort(), np.empty(), np.exp(), np.outer(), np.pi,
+          block_sizes(), uniform_plan()
+    objective: to precompute the complex exponentials of the spectrum once
+               per dataset, the spectrum of every residue S over every subset
+               of W is then only a matrix-vector product (phasors are not
+               stored for uniformly sampled T, the chirp-z transform is
+               faster there)
+    """
+    T = np.ravel(T)
+    W = np.array(W, dtype=np.float64)
+    N = len(T)
+    L = len(W)
+    order = np.argsort(W, kind='mergesort')
+    if N == 0 or L * N * 16 > memory_limit or\
+            uniform_plan(T, W) is not None:
+        return [W, order, None]
+    E = np.empty((L, N), dtype=np.complex128)
+    block_W, block_T = block_sizes(L, N, SPECTRUM_MEMORY_LIMIT)
+    for w_start in range(0, L, block_W):
+        w_finish = w_start + block_W
+        E[w_start: w_finish] = np.exp(np.outer(W[w_start: w_finish], T) *
+                                      (-2j * np.pi)) / N
+    return [W, order, E]
+
+
+def basis_rows(basis, W):
+    """
+    input: basis list, output of build_basis()
            W numpy array Lx1, sequence of reasonable frequencies
+    output: rows numpy array Lx1 int, positions of W in the basis, or None
+                                      if some frequency of W is not in
+                                      the basis
+    uses: np.searchsorted(), np.minimum(), np.all()
+    objective: to find rows of stored phasors corresponding to the (reduced)
+               sequence of frequencies
+    """
+    W_basis, order = basis[0], basis[1]
+    if len(W_basis) == 0:
+        return None
+    sorted_W = W_basis[order]
+    positions = np.minimum(np.searchsorted(sorted_W, W), len(sorted_W) - 1)
+    if not np.all(sorted_W[positions] == W):
+        return None
+    return order[positions]
+
+
+def spectrum(T, S, W, basis):
+    """
+    input: T numpy array Nx1, time positions of measured values
+           S numpy array Nx1, sequence of measured values
+           W numpy array Lx1, sequence of reasonable frequencies
+           basis list, output of build_basis(T, W_0), or None
     output: G numpy array Lx1, sequence of complex numbers corresponding
             to the frequencies from W
-    uses: np.e, np.newaxis, np.pi, np.mean()
-    objective: to find sparse(?) frequency spectrum of the sequence S
+    uses: np.dot(), np.ravel(),
+          chirp_z_spectrum(), basis_rows(), complex_numbers_batch()
+    objective: to use the chirp-z transform for uniformly sampled T,
+               stored phasors if they
+               are available, otherwise to compute the spectrum in blocks
     """
-    Gs = S * (np.e ** (W[:, np.newaxis] * T * (-1j) * np.pi * 2))
-    G = np.mean(Gs, axis=1)
+    G = chirp_z_spectrum(T, S, W)
+    if G is not None:
+        return G
+    if basis is not None and basis[2] is not None and\
+            basis[2].shape[1] == len(np.ravel(S)):
+        rows = basis_rows(basis, W)
+        if rows is not None:
+            return np.dot(basis[2][rows], np.ravel(S))
+    return complex_numbers_batch(T, S, W)
+
+
+def uniform_plan(T, W):
+    """
+    input: T numpy array Nx1, time positions of measured values
+           W numpy array Lx1, sequence of reasonable frequencies
+    output: plan tuple (positions, indices, start, spacing, length) or None,
+                 positions numpy array Nx1 int, indices of T on the uniform
+                                                grid of times
+                 indices numpy array Lx1 int, indices of W on the uniform
+                                              grid of frequencies
+                 start float, the lowest frequency in cycles per sample
+                 spacing float, spacing of frequencies in cycles per sample
+                 length int, length of FFTs of the chirp-z transform
+            None is returned, if T or W are not on uniform grids or
+            the transform would not be faster than the exact computation
+    uses: np.diff(), np.min(), np.round(), np.abs(), np.max(), np.unique(),
+          np.log2()
+    objective: to find out if the spectrum can be computed by the chirp-z
+               transform (times and frequencies on uniform grids, with gaps)
+    """
+    T = np.ravel(T)
+    W = np.ravel(W)
+    N = len(T)
+    if N < 2 or len(W) == 0:
+        return None
+    step = np.min(np.diff(T))
+    if step <= 0:
+        return None
+    # the step is refined over the whole span, rounding of large times
+    # would accumulate over positions otherwise
+    step = (T[-1] - T[0]) / np.round((T[-1] - T[0]) / step)
+    positions = np.round((T - T[0]) / step)
+    if np.max(np.abs(positions * step - (T - T[0]))) > UNIFORM_TOLERANCE * step:
+        return None
+    unique_W = np.unique(W)
+    if len(unique_W) > 1:
+        spacing = np.min(np.diff(unique_W))
+    else:
+        spacing = 1.0 / (step * (positions[-1] + 1))
+    indices = np.round((W - unique_W[0]) / spacing)
+    if np.max(np.abs(indices * spacing - (W - unique_W[0]))) >\
+            UNIFORM_TOLERANCE * spacing:
+        return None
+    samples = int(positions[-1]) + 1
+    frequencies = int(np.max(indices)) + 1
+    length = 1
+    while length < samples + frequencies - 1:
+        length *= 2
+    if length * np.log2(length) > len(W) * N:
+        return None
+    return np.int64(positions), np.int64(indices), unique_W[0] * step,\
+        spacing * step, length
+
+
+def chirp_z_spectrum(T, S, W):
+    """
+    input: T numpy array Nx1, time positions of measured values
+           S numpy array Nx1, sequence of measured values
+           W numpy array Lx1, sequence of reasonable frequencies
+    output: G numpy array Lx1, sequence of complex numbers corresponding
+            to the frequencies from W, or None if the transform is not
+            applicable
+    uses: np.zeros(), np.arange(), np.exp(), np.mod(), np.fft.fft(),
+          np.fft.ifft(), np.pi, uniform_plan()
+    objective: to compute the same spectrum as complex_numbers_batch() by
+               the chirp-z (Bluestein) transform of the residues placed
+               on the uniform grid of times (zeros in gaps), it is exact for
+               any spacing of frequencies, w * p = (w ** 2 + p ** 2 -
+               (w - p) ** 2) / 2 turns the sum into a convolution computed
+               by FFT in O((N + L) log(N + L))
+    """
+    T = np.ravel(T)
+    S = np.ravel(S)
+    W = np.ravel(W)
+    plan = uniform_plan(T, W)
+    if plan is None:
+        return None
+    positions, indices, start, spacing, length = plan
+    samples = positions[-1] + 1
+    frequencies = np.max(indices) + 1
+    zero_filled = np.zeros(samples, dtype=np.complex128)
+    zero_filled[positions] = S
+    # phases are reduced before np.exp(), squares of indices are large
+    p = np.arange(samples)
+    chirped = zero_filled * np.exp((-2j * np.pi) *
+                                   (np.mod(start * p, 1.0) +
+                                    np.mod(0.5 * spacing * p * p, 1.0)))
+    m = np.arange(-(samples - 1), frequencies)
+    chirp = np.exp((2j * np.pi) * np.mod(0.5 * spacing * m * m, 1.0))
+    convolved = np.fft.ifft(np.fft.fft(chirped, length) *
+                            np.fft.fft(chirp, length))
+    l = np.arange(frequencies)
+    G = convolved[samples - 1: samples - 1 + frequencies] *\
+        np.exp((-2j * np.pi) * np.mod(0.5 * spacing * l * l, 1.0))
+    G = G[indices]
+    # shift of the grid origin to T[0] and mean over measurements
+    G *= np.exp(W * T[0] * (-2j * np.pi)) / len(T)
+    return G
+
+
+def complex_numbers_batch(T, S, W, memory_limit=SPECTRUM_MEMORY_LIMIT):
+    """
+    input: T numpy array Nx1, time positions of measured values
+           S numpy array Nx1, sequence of measured values
+           W numpy array Lx1, sequence of reasonable frequencies
+           memory_limit int, upper bound (in bytes) of temporary arrays
+    output: G numpy array Lx1, sequence of complex numbers corresponding
+            to the frequencies from W
+    uses: np.zeros(), np.exp(), np.outer(), np.dot(), np.pi,
+          block_sizes()
+    objective: to find sparse(?) frequency spectrum of the sequence S,
+               the matrix S * e**(W*T*-2pi*i) is not created at once, the sum
+               over T is accumulated in blocks (of frequencies and times)
+               that fit into memory_limit
+    """
+    T = np.ravel(T)
+    S = np.ravel(S)
+    N = len(T)
+    L = len(W)
+    G = np.zeros(L, dtype=np.complex128)
+    if N == 0:
+        return G * np.nan  # mean of an empty sequence
+    block_W, block_T = block_sizes(L, N, memory_limit)
+    for w_start in range(0, L, block_W):
+        w_finish = w_start + block_W
+        for t_start in range(0, N, block_T):
+            t_finish = t_start + block_T
+            phasors = np.exp(np.outer(W[w_start: w_finish],
+                                      T[t_start: t_finish]) * (-2j * np.pi))
+            G[w_start: w_finish] += np.dot(phasors, S[t_start: t_finish])
+    G /= N
     return G
 
 
+def block_sizes(L, N, memory_limit):
+    """
+    input: L int, number of frequencies
+           N int, number of time positions
+           memory_limit int, upper bound (in bytes) of temporary arrays
+    output: block_W int, number of frequencies in one block
+            block_T int, number of time positions in one block
+    uses: max(), min()
+    objective: to find the largest blocks of the spectrum matrix, that fit
+               into memory_limit (one element of the block needs 16 bytes
+               as complex128, its computation creates one more float64 and
+               one more complex128 temporary array of the same shape)
+    """
+    elements = max(int(memory_limit // (8 + 16 + 16)), 1)
+    block_T = max(min(N, elements), 1)
+    block_W = max(min(L, elements // block_T), 1)
+    return block_W, block_T
+
+
 def max_influence(W, G):
     """
     input: W numpy array Lx1, sequence of reasonable frequencies
@@ -22,6 +22,9 @@ output: input_coordinates numpy array, coordinates for model creation
                                              dimension
         T numpy array shape_of_grid[0]x1, time positions of timeframes
 
+with lazy=True, input_coordinates are a LazyGrid, which creates rows
+of the cartesian product on demand.
+
 timestep and edge_of_square has to be chosen based on desired granularity,
 timestep refers to the time variable,
 edge_of_square refers to other variables - it is supposed that the step
@@ -34,12 +37,15 @@ import numpy as np
 import dataset_io as dio
 
 
-def time_space_positions(edges_of_cell, data, dataset):
+def time_space_positions(edges_of_cell, data, dataset, lazy=False):
     """
     input: edge_of_square float, spatial edge of cell in default units (meters)
            timestep float, time edge of cell in default units (seconds)
            path string, path to file
+           lazy bool, if True, input_coordinates are not created, LazyGrid
+                      creates their parts on demand
     output: input_coordinates numpy array, coordinates for model creation
+                                           (LazyGrid, if lazy)
             time_frame_sums numpy array shape_of_grid[0]x1, sum of measures
                                                             over every
                                                             timeframe
@@ -48,17 +54,20 @@ def time_space_positions(edges_of_cell, data, dataset):
                                                  dimension
             T numpy array shape_of_grid[0]x1, time positions of timeframes
     uses: loading_data(), number_of_edges(), hist_params(),
-          cartesian_product()
+          cartesian_product(), LazyGrid()
     objective: to find central positions of cels of grid
     """
     extended_shape_of_grid = number_of_cells(dataset[:, 0:-1], edges_of_cell)
     if dio.is_numpy_array(data):
-        central_points, time_frame_sums, overall_sum =\
+        central_points, time_frame_sums, overall_sum, edges =\
             hist_params(data, extended_shape_of_grid)
     else:  # musim zmenit, je zbytecne to volat cele
-        central_points, time_frame_sums, overall_sum =\
+        central_points, time_frame_sums, overall_sum, edges =\
             hist_params(dataset[:, 0:-1], extended_shape_of_grid)
-    input_coordinates = cartesian_product(*central_points)
+    if lazy:
+        input_coordinates = LazyGrid(central_points, edges)
+    else:
+        input_coordinates = cartesian_product(*central_points)
     T = central_points[0]
     all_timesteps = np.histogramdd(dataset[:, 0:1],
                                    bins=extended_shape_of_grid[0][0:1],
@@ -80,6 +89,7 @@ def hist_params(data, extended_shape_of_grid):
                                                             over every
                                                             timeframe
             overall_sum number (np.float64 or np.int64), sum of all measures
+            edges list(numpy arrays), edges of cells in every dimension
     uses: np.histogramdd(), np.arange(), np.shape(),np.sum()
     objective: find central points of cells of grid
     """
@@ -93,7 +103,7 @@ def hist_params(data, extended_shape_of_grid):
     osy = tuple(np.arange(len(np.shape(histogram)) - 1) + 1)
     time_frame_sums = np.sum(histogram, axis=osy)
     overall_sum = np.sum(time_frame_sums)
-    return central_points, time_frame_sums, overall_sum
+    return central_points, time_frame_sums, overall_sum, edges
 
 
 def number_of_cells(data, edges_of_cell):
@@ -140,3 +150,153 @@ def cartesian_product(*arrays):
     for i, a in enumerate(np.ix_(*arrays)):
         arr[..., i] = a
     return arr.reshape(-1, la)
+
+
+class LazyGrid(object):
+    """
+    rows of cartesian_product(*central_points) created on demand, the grid
+    can be restricted to some timeframes (rows are ordered by time, so every
+    timeframe is a block of cells_of_frame rows)
+    call LazyGrid(central_points, edges, frames)
+    where
+    input: central_points list(numpy arrays), central points of cells
+                                              in every dimension (time
+                                              first)
+           edges list(numpy arrays), edges of cells in every dimension
+           frames numpy array int, indices of timeframes of the grid
+                                   (None for all timeframes)
+    and the grid is used like input_coordinates by model.frequencies(),
+    model.coordinates_densities() and model.model_creation(), its parts
+    (grid[start: finish, :]) or chosen rows (grid[rows]) are created
+    by coordinates()
+    """
+    __slots__ = ('central_points', 'edges', 'frames', 'cells_of_frame')
+
+    def __init__(self, central_points, edges, frames=None):
+        self.central_points = [np.asarray(axis) for axis in central_points]
+        self.edges = edges
+        if frames is None:
+            frames = np.arange(len(self.central_points[0]))
+        self.frames = np.asarray(frames, dtype=np.int64)
+        self.cells_of_frame = int(np.prod([len(axis) for axis in
+                                           self.central_points[1:]]))
+
+    @property
+    def shape(self):
+        """
+        number of rows and columns of the grid (like numpy arrays)
+        """
+        return (len(self.frames) * self.cells_of_frame,
+                len(self.central_points))
+
+    @property
+    def shape_of_grid(self):
+        """
+        number of cells in every dimension (selected timeframes in time)
+        """
+        return [len(self.frames)] + [len(axis) for axis in
+                                     self.central_points[1:]]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        """
+        input: key slice or numpy array int, rows (or tuple of rows and
+                                             columns)
+        output: coordinates numpy array, chosen rows of the grid
+        uses: coordinates(), np.arange()
+        objective: to slice the grid like input_coordinates
+        """
+        columns = slice(None)
+        if isinstance(key, tuple):
+            key, columns = key
+        if isinstance(key, slice):
+            rows = np.arange(*key.indices(len(self)))
+        else:
+            rows = np.asarray(key)
+        return self.coordinates(rows)[:, columns]
+
+    def coordinates(self, rows):
+        """
+        input: rows numpy array int, rows of the grid
+        output: coordinates numpy array len(rows)xd, central positions
+                                                     of cells
+        uses: np.divmod(), np.unravel_index(), np.empty()
+        objective: to create rows of the cartesian product
+        """
+        positions, cells = np.divmod(rows, self.cells_of_frame)
+        coordinates = np.empty((len(rows), len(self.central_points)))
+        coordinates[:, 0] = self.central_points[0][self.frames[positions]]
+        if len(self.central_points) > 1:
+            indices = np.unravel_index(cells, self.shape_of_grid[1:])
+            for axis in range(1, len(self.central_points)):
+                coordinates[:, axis] =\
+                    self.central_points[axis][indices[axis - 1]]
+        return coordinates
+
+    def restricted(self, selected):
+        """
+        input: selected numpy array, bool mask or indices of timeframes
+                                     of this grid
+        output: grid LazyGrid, the grid of selected timeframes
+        uses: LazyGrid()
+        objective: to restrict the grid to some timeframes, e.g. valid
+                   (measured) ones
+        """
+        return LazyGrid(self.central_points, self.edges,
+                        self.frames[selected])
+
+    def phase_classes(self, structure, resolution=0.0):
+        """
+        input: structure list(int, list(floats), list(floats)),
+                          number of non-hypertime dimensions, list
+                          of hypertime radii nad list of wavelengths
+               resolution float, width of bins of phases in the units
+                                 of time, zero for exactly equal phases only
+        output: representatives LazyGrid, grid of one timeframe of every
+                                          class
+                inverse numpy array len(frames), class of every timeframe
+                counts numpy array m, numbers of timeframes in the classes
+        uses: dio.time_classes(), LazyGrid()
+        objective: to find timeframes with the same phase on every period
+                   (up to the resolution), like dio.phase_classes(), but
+                   classes are found for timeframes (all their cells
+                   belong to the classes of cells of the grid), so rows
+                   of the grid are not created
+        """
+        times = self.central_points[0][self.frames]
+        first, inverse, counts = dio.time_classes(times, structure[2],
+                                                  resolution)
+        return LazyGrid(self.central_points, self.edges, self.frames[first]),\
+            inverse, counts.astype(float)
+
+    def rows_of(self, data):
+        """
+        input: data numpy array nxd, positions IRL (time in the first
+                                     column)
+        output: rows numpy array n int, row of the cell of every position
+                inside numpy array n bool, True for positions in the grid
+        uses: np.searchsorted(), np.ravel_multi_index(), np.full()
+        objective: to find cells of positions like np.histogramdd() with
+                   the same edges (the last edge belongs to the last cell),
+                   positions outside the grid or its timeframes are marked
+        """
+        indices = []
+        inside = np.ones(len(data), dtype=bool)
+        for axis in range(len(self.edges)):
+            values = data[:, axis]
+            index = np.searchsorted(self.edges[axis], values, side='right')
+            index[values == self.edges[axis][-1]] -= 1
+            index -= 1
+            inside &= (index >= 0) & (index < len(self.central_points[axis]))
+            indices.append(np.where(inside, index, 0))
+        positions = np.full(len(self.central_points[0]), -1, dtype=np.int64)
+        positions[self.frames] = np.arange(len(self.frames))
+        frames = positions[indices[0]]
+        inside &= frames >= 0
+        rows = np.where(inside, frames, 0) * self.cells_of_frame
+        if len(self.edges) > 1:
+            rows += np.ravel_multi_index(tuple(indices[1:]),
+                                         self.shape_of_grid[1:])
+        return rows, inside
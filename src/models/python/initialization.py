@@ -4,7 +4,7 @@
 """
 initializes the learning proces ("iteration 0").
 call whole_initialization(path, k, edge_of_square, timestep, longest, shortest,
-                          radius)
+                          radius, options)
 where
 input: path string, path to file
        k positive integer, number of clusters
@@ -15,6 +15,7 @@ input: path string, path to file
        shortest float, legth of the shortest wanted period
                        in default units
        radius float, size of radius of the first found hypertime circle
+       options dict, optional settings of learning (see learning.py)
 and
 output: input_coordinates numpy array, coordinates for model creation
         overall_sum number (np.float64 or np.int64), sum of all measures
@@ -35,6 +36,7 @@ output: input_coordinates numpy array, coordinates for model creation
         density_integrals numpy array kx1, matrix of ratios between
                                            measurements and grid cells
                                            belonging to the clusters
+        basis list, precomputed phasors for fm.chosen_period()
 """
 
 import numpy as np
@@ -45,7 +47,7 @@ import model as mdl
 
 
 def whole_initialization(training_data, k, edges_of_cell, longest,
-                         shortest, training_dataset):
+                         shortest, training_dataset, options=None):
     """
     input: path string, path to file
            k positive integer, number of clusters
@@ -55,6 +57,7 @@ def whole_initialization(training_data, k, edges_of_cell, longest,
                           units
            shortest float, legth of the shortest wanted period
                            in default units
+           options dict, optional settings of learning (see learning.py)
     output: input_coordinates numpy array, coordinates for model creation
             overall_sum number (np.float64 or np.int64), sum of all measures
             structure list(int, list(floats), list(floats)),
@@ -74,16 +77,22 @@ def whole_initialization(training_data, k, edges_of_cell, longest,
             density_integrals numpy array kx1, matrix of ratios between
                                                measurements and grid cells
                                                belonging to the clusters
+            basis list, precomputed phasors for fm.chosen_period()
     uses: first_structure(), mdl.model_creation(), grid.time_space_positions(),
-          first_time_frame_freqs(), fm.build_frequencies(), fm.chosen_period()
+          first_time_frame_freqs(), fm.build_frequencies(), fm.build_basis(),
+          fm.chosen_period()
     objective: to perform first iteration step and to initialize variables
     """
     print('starting learning iteration: 0 (initialization)')
+    if options is None:
+        options = {}
     structure = first_structure(training_data)
     input_coordinates, time_frame_sums, overall_sum, shape_of_grid, T,\
         valid_timesteps = grid.time_space_positions(edges_of_cell,
                                                     training_data,
-                                                    training_dataset)
+                                                    training_dataset,
+                                                    options.get('lazy_grid',
+                                                                False))
     if len(shape_of_grid[0]) == 1:
         hist_freqs = -1
         C = -1
@@ -94,18 +103,24 @@ def whole_initialization(training_data, k, edges_of_cell, longest,
         hist_freqs, C, U, COV, density_integrals =\
             mdl.model_creation(input_coordinates, structure, training_data,
                                0, 0,  # C_in and U_in
-                               k, shape_of_grid)
+                               k, shape_of_grid, options,
+                               marginal=True)  # the histogram is not used
     time_frame_freqs = first_time_frame_freqs(overall_sum, shape_of_grid[0])
-    W = fm.build_frequencies(longest, shortest)
+    W = fm.build_frequencies(longest, shortest,
+                             options.get('coarseness', 1))
+    basis = fm.build_basis(T, W)
     ES = -1  # no previous error
     P, W, ES, dES = fm.chosen_period(T, time_frame_sums,
                                      time_frame_freqs[0], W, ES,
-                                     valid_timesteps)
+                                     valid_timesteps, basis,
+                                     options.get('refined_peaks', 0),
+                                     options.get('refinement_tolerance',
+                                                 1e-3))
     print('used structure: ' + str(structure))
     print('leaving learning iteration: 0 (initialization)')
     return input_coordinates, overall_sum, structure, C,\
         U, shape_of_grid, time_frame_sums, T, W, ES, P, COV,\
-        density_integrals, valid_timesteps
+        density_integrals, valid_timesteps, basis
 
 
 def first_time_frame_freqs(overall_sum, shape_of_grid):
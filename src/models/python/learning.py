@@ -4,7 +4,7 @@
 """
 returns parameters of the learned model
 call proposed_method(longest, shortest, path, edge_of_square, timestep, k,
-                     radius, number_of_periods, evaluation)
+                     radius, number_of_periods, evaluation, options)
 where
 input: longest float, legth of the longest wanted period in default
                       units
@@ -17,6 +17,95 @@ input: longest float, legth of the longest wanted period in default
        radius float, size of radius of the first found hypertime circle
        number_of_periods int, max number of added hypertime circles
        evaluation boolean, stop learning when the error starts to grow?
+       options dict, optional settings of learning (missing keys mean
+                     default values), possible keys:
+               'coarseness' int, spacing of searched frequencies
+                                 in multiples of 1/longest (default 1)
+               'refined_peaks' int, number of the strongest peaks of
+                                    the spectrum refined between
+                                    the frequencies (default 0, no
+                                    refinement)
+               'refinement_tolerance' float, precision of the refinement
+                                             relative to the spacing
+                                             of frequencies (default 1e-3)
+               'block_size' int, number of observations clustered at once,
+                                 U is not kept if the data are larger
+                                 (default 0, all data at once)
+               'seeding' string, initialization of clustering, 'random' or
+                                 'plus_plus' (k-means++ with hypertime
+                                 distances) (default 'random')
+               'warm_start' bool, clustering starts from centres and weights
+                                  of the previous learning iteration lifted
+                                  into the new hypertime space, 'seeding'
+                                  is used when there are none and for all
+                                  other restarts than the first one
+                                  (default False)
+               'accelerated' bool, hard k-means skips distances, that can
+                                   not change the partition, results are
+                                   the same (default True)
+               'collapse' float, observations projected into hypertime are
+                                 collapsed into weighted ones before
+                                 clustering, the value is the tolerance of
+                                 quantisation, 0.0 for exact duplicates only
+                                 (default None, no collapsing)
+               'mini_batch' int, size of batches of mini-batch clustering,
+                                 centres are learned from random batches
+                                 of observations, faster but less accurate
+                                 for long datasets (default 0, full
+                                 clustering)
+               'mini_batch_iterations' int, maximal number of batches
+                                            (default 100)
+               'mini_batch_forgetting' float, (0, 1], forgetting of previous
+                                              batches, 1.0 gives the learning
+                                              rate 1/t (default 1.0)
+               'phases' bool, clustering and evaluation of grids use
+                              the phase representation of hypertime (one
+                              phase per circle, distances without
+                              goniometric functions), centres are circular
+                              means lying on circles and the model keeps
+                              the usual representation (default False)
+               'memory_budget' int, bytes of temporary arrays for one part
+                                   of the grid evaluated at once, peak
+                                   memory of learning is printed at
+                                   the end (default mdl.MEMORY_BUDGET)
+               'threads' int, number of threads evaluating parts
+                              of the grid at once, every thread needs
+                              its own 'memory_budget' (default None,
+                              evaluation without threads)
+               'phase_resolution' float, cells of grids with the same
+                                         phases on all periods (in bins
+                                         of this width in the units of
+                                         time, 0.0 for equal phases only)
+                                         and the same other coordinates
+                                         are evaluated once (default None,
+                                         every cell is evaluated)
+               'density_samples' int, number of cells sampled
+                                     to estimate the number of cells
+                                     belonging to clusters (quasi-Monte-
+                                     Carlo), its estimated relative error
+                                     is printed (default None, all cells
+                                     of the grid)
+               'lazy_grid' bool, rows of grids are created part by part
+                                and not kept, the evaluation uses valid
+                                timeframes and occupied cells only
+                                (default False, grids are created
+                                by grid.cartesian_product())
+               'restarts' int, number of clusterings tried for every tested
+                               number of clusters (default 3)
+               'final_restarts' int, number of clusterings tried for
+                                     the final model (default 6)
+               'processes' int, number of processes computing restarts
+                                in parallel, every restart gets its own
+                                seed derived from the state of np.random,
+                                so the result does not depend on
+                                the number of processes (default None,
+                                restarts are computed sequentially
+                                without seeding)
+               'projection_cache' int, bytes of projections of data into
+                                      hypertime cached during learning
+                                      (outside of 'memory_budget', 0 for
+                                      no cache, default
+                                      dio.PROJECTION_CACHE_LIMIT)
 and
 output: C numpy array kxd, matrix of k d-dimensional cluster centres
         COV numpy array kxdxd, matrix of covariance matrices
@@ -32,6 +121,7 @@ output: C numpy array kxd, matrix of k d-dimensional cluster centres
 import numpy as np
 from time import clock
 import copy as cp
+import multiprocessing as mp
 
 import model as mdl
 import fremen as fm
@@ -39,8 +129,37 @@ import initialization as init
 import dataset_io as dio
 import evaluation as ev
 
+
+# arguments of iteration_step() shared by parallel restarts, forked processes
+# inherit them instead of receiving a pickled copy with every task
+_shared_arguments = None
+
+
 def proposed_method(longest, shortest, dataset, edges_of_cell, k,
-                    radius, number_of_periods, evaluation):
+                    radius, number_of_periods, evaluation, options=None):
+    """
+    input: the same as learning_method()
+    output: the same as learning_method()
+    uses: dio.set_projection_limit(), dio.clear_projections(),
+          learning_method()
+    objective: to learn model parameters, cached projections are limited
+               by 'projection_cache' and released at the end (also when
+               learning fails)
+    """
+    if options is None:
+        options = {}
+    dio.set_projection_limit(options.get('projection_cache', None))
+    try:
+        return learning_method(longest, shortest, dataset, edges_of_cell, k,
+                               radius, number_of_periods, evaluation,
+                               options)
+    finally:
+        dio.clear_projections()  # learning finished, cached data not needed
+        dio.set_projection_limit()
+
+
+def learning_method(longest, shortest, dataset, edges_of_cell, k,
+                    radius, number_of_periods, evaluation, options=None):
     """
     input: longest float, legth of the longest wanted period in default
                           units
@@ -54,6 +173,7 @@ def proposed_method(longest, shortest, dataset, edges_of_cell, k,
            radius float, size of radius of the first found hypertime circle
            number_of_periods int, max number of added hypertime circles
            evaluation boolean, stop learning when the error starts to grow?
+           options dict, optional settings of learning (see above)
     output: C numpy array kxd, matrix of k d-dimensional cluster centres
             COV numpy array kxdxd, matrix of covariance matrices
             density_integrals numpy array kx1, matrix of ratios between
@@ -64,17 +184,21 @@ def proposed_method(longest, shortest, dataset, edges_of_cell, k,
                       radii nad list of wavelengths
             average DODELAT
     uses: time.clock()
-          init.whole_initialization(), iteration_step()
-    objective: to learn model parameters
+          init.whole_initialization(), iteration_step(), step_evaluation(),
+          parallel_restarts()
+    objective: to learn model parameters (called by proposed_method())
     """
     # initialization
+    if options is None:
+        options = {}
     training_data, evaluation_dataset, training_dataset =\
         dio.divide_dataset(dataset)
     input_coordinates, overall_sum, structure, C, U,\
         shape_of_grid, time_frame_sums, T, W, ES, P, COV,\
-        density_integrals, valid_timesteps =\
+        density_integrals, valid_timesteps, basis =\
         init.whole_initialization(training_data, k, edges_of_cell,
-                                  longest, shortest, training_dataset)
+                                  longest, shortest, training_dataset,
+                                  options)
     # initialization of fiff, probably better inside  "whole_initialization"
     diff = -1
     # iteration
@@ -111,13 +235,9 @@ def proposed_method(longest, shortest, dataset, edges_of_cell, k,
     while jump_out == 0:
         print('\nstarting learning iteration: ' + str(iteration))
         print('trying to remove chosen peridicity: ' + str(P))
-        try:
-            WW = list(W)
-            WW.remove(1/P)  # P
-            W = np.array(WW)
+        if P > 0.0 and len(W) > 0:
+            W = fm.remove_period(W, P)
             print('periodicity ' + str(P) + ' removed')
-        except ValueError:
-            pass
         iteration += 1
         start = clock()
         if evaluation:
@@ -126,7 +246,8 @@ def proposed_method(longest, shortest, dataset, edges_of_cell, k,
                                 C, U, k, shape_of_grid, time_frame_sums, T, W,
                                 ES, COV, density_integrals, P, radius,
                                 valid_timesteps,
-                                evaluation_dataset, edges_of_cell, diff)
+                                evaluation_dataset, edges_of_cell, diff,
+                                basis, options)
         else:
             structure[2].append(P)
             if len(structure[2]) == 1:
@@ -139,7 +260,8 @@ def proposed_method(longest, shortest, dataset, edges_of_cell, k,
                 iteration_step(training_data, input_coordinates, structure, C,
                                U, k, shape_of_grid, time_frame_sums, T, W, ES,
                                valid_timesteps,
-                               evaluation_dataset, edges_of_cell)
+                               evaluation_dataset, edges_of_cell, basis,
+                               options)
             jump_out = 0
         if len(structure[1]) >= number_of_periods:
             jump_out = 1
@@ -155,12 +277,17 @@ def proposed_method(longest, shortest, dataset, edges_of_cell, k,
         if evaluation:
             list_of_diffs = []                                                       
             list_of_others = []                                                     
-            for j in xrange(6):  # looking for the best clusters      
+            final_restarts = options.get('final_restarts', 6)
+            results = parallel_restarts((training_data, input_coordinates,
+                                         structure, C, U, k, shape_of_grid,
+                                         time_frame_sums, T, W, ES,
+                                         valid_timesteps, evaluation_dataset,
+                                         edges_of_cell, basis, options),
+                                        final_restarts,
+                                        options.get('processes', None))
+            for result in results:  # looking for the best clusters
                 sum_of_amplitudes_j, Cj, Uj, COVj, density_integrals_j, Wj, ESj,\
-                    Pj, diff_j = iteration_step(training_data, input_coordinates,   
-                                     structure, C, U, k, shape_of_grid,       
-                                     time_frame_sums, T, W, ES, valid_timesteps,    
-                                     evaluation_dataset, edges_of_cell)             
+                    Pj, diff_j = result
                 list_of_diffs.append(diff_j)                            
                 list_of_others.append((Cj, COVj, density_integrals_j))                           
             best_position = np.argmin(list_of_diffs)
@@ -169,7 +296,10 @@ def proposed_method(longest, shortest, dataset, edges_of_cell, k,
             print('all diffs in comparison: ' + str(list_of_diffs))
         else:
             diff = ev.evaluation_step(evaluation_dataset, C, COV, density_integrals,\
-                                      structure, k, edges_of_cell)
+                                      structure, k, edges_of_cell, options)
+    peak = mdl.peak_memory()
+    if peak is not None:
+        print('peak memory of learning: ' + str(peak / 2 ** 20) + ' MiB')
     print(diff)
     print('using k = ' + str(k))
     print('and structure: ' + str(structure) + '\n\n')
@@ -180,7 +310,8 @@ def proposed_method(longest, shortest, dataset, edges_of_cell, k,
 def step_evaluation(training_data, input_coordinates, structure, C, U, k,
                     shape_of_grid, time_frame_sums, T, W, ES, COV,
                     density_integrals, P, radius, valid_timesteps,
-                    evaluation_dataset, edges_of_cell, diff_old):
+                    evaluation_dataset, edges_of_cell, diff_old, basis=None,
+                    options=None):
     """
     input: path string, path to file
            input_coordinates numpy array, coordinates for model creation
@@ -205,6 +336,9 @@ def step_evaluation(training_data, input_coordinates, structure, C, U, k,
            P float64, length of the most influential frequency in default
                       units
            radius float, size of radius of the first found hypertime circle
+           basis list, precomputed phasors for fm.chosen_period(), shared
+                       by all restarts (or None)
+           options dict, optional settings of learning (see above)
     output: jump_out int, zero or one - to jump or not to jump out of learning
             structure list(int, list(floats), list(floats)),
                       number of non-hypertime dimensions, list of hypertime
@@ -219,10 +353,14 @@ def step_evaluation(training_data, input_coordinates, structure, C, U, k,
             ES float64, squared sum of squares of residues from this iteration
             P float64, length of the most influential frequency in default
                        units
-    uses: iteration_step()
+    uses: parallel_restarts()
           cp.deepcopy()
     objective: to send new or previous version of model (and finishing pattern)
     """
+    if options is None:
+        options = {}
+    restarts = options.get('restarts', 3)
+    processes = options.get('processes', None)
     new_structure = cp.deepcopy(structure)
     if P > 0.0:
         new_structure[2].append(P)
@@ -242,12 +380,15 @@ def step_evaluation(training_data, input_coordinates, structure, C, U, k,
         #k = k + 1
         list_of_sums = []
         list_of_others = []
-        for j in xrange(3):  # for the case that the clustering would fail
+        results = parallel_restarts((training_data, input_coordinates,
+                                     new_structure, C, U, k_j, shape_of_grid,
+                                     time_frame_sums, T, W, ES,
+                                     valid_timesteps, evaluation_dataset,
+                                     edges_of_cell, basis, options),
+                                    restarts, processes)
+        for result in results:  # for the case that the clustering would fail
             sum_of_amplitudes_j, Cj, Uj, COVj, density_integrals_j, Wj, ESj,\
-                Pj, diff_j = iteration_step(training_data, input_coordinates,
-                                 new_structure, C, U, k_j, shape_of_grid,
-                                 time_frame_sums, T, W, ES, valid_timesteps,
-                                 evaluation_dataset, edges_of_cell)
+                Pj, diff_j = result
             list_of_sums.append(sum_of_amplitudes_j)
             list_of_others.append((Cj, Uj, COVj, density_integrals_j, Pj, Wj,
                                    ESj, k_j, diff_j))
@@ -280,9 +421,118 @@ def step_evaluation(training_data, input_coordinates, structure, C, U, k,
     return jump_out, k, structure, C, U, COV, density_integrals, W, ES, P, diff
 
 
+def parallel_restarts(arguments, number_of_restarts, processes):
+    """
+    input: arguments tuple, arguments of iteration_step()
+           number_of_restarts int, number of independent calls
+                                   of iteration_step()
+           processes int, number of processes computing restarts in parallel,
+                          None for sequential restarts without seeding
+    output: results list, outputs of iteration_step() for every restart
+    uses: np.random.randint(), np.random.get_state(),
+          np.random.set_state(), mp.Pool(),
+          iteration_step(), seeded_iteration_step(),
+          pooled_iteration_step(), process_pool(), restart_arguments()
+    objective: to compute independent restarts of clustering (and model
+               creation) in a pool of processes, every restart gets its own
+               seed, the large read-only arguments are inherited by forked
+               processes (not pickled for every task)
+    """
+    global _shared_arguments
+    if processes is None:
+        return [iteration_step(*restart_arguments(arguments, j))
+                for j in xrange(number_of_restarts)]
+    seeds = np.random.randint(2 ** 31 - 1, size=number_of_restarts)
+    tasks = list(enumerate(seeds))
+    _shared_arguments = arguments
+    try:
+        if processes <= 1 or number_of_restarts <= 1:
+            # restarts are seeded in this process, the state of np.random
+            # is restored, so later draws equal those with the pool
+            state = np.random.get_state()
+            try:
+                results = [seeded_iteration_step(task) for task in tasks]
+            finally:
+                np.random.set_state(state)
+        else:
+            pool = process_pool(min(processes, number_of_restarts))
+            try:
+                results = pool.map(pooled_iteration_step, tasks)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        _shared_arguments = None
+    return results
+
+
+def seeded_iteration_step(task):
+    """
+    input: task tuple(int, int), number of the restart and seed of np.random
+                                 for this restart
+    output: outputs of iteration_step() called with _shared_arguments
+    uses: np.random.seed(),
+          iteration_step(), restart_arguments()
+    objective: to compute one restart (in a process of the pool)
+    """
+    restart, seed = task
+    np.random.seed(seed)
+    return iteration_step(*restart_arguments(_shared_arguments, restart))
+
+
+def pooled_iteration_step(task):
+    """
+    input: task tuple(int, int), number of the restart and seed of np.random
+                                 for this restart
+    output: outputs of seeded_iteration_step()
+    uses: seeded_iteration_step(), dio.clear_projections()
+    objective: to compute one restart in a process of the pool, projections
+               cached by the process are released after the restart, so
+               processes of the pool do not keep their own caches
+    """
+    try:
+        return seeded_iteration_step(task)
+    finally:
+        dio.clear_projections()
+
+
+def restart_arguments(arguments, restart):
+    """
+    input: arguments tuple, arguments of iteration_step() (options last)
+           restart int, number of the restart
+    output: arguments tuple, arguments of iteration_step() for this restart
+    uses: dict()
+    objective: to warm-start the first restart only, the warm start is
+               deterministic (all warm-started restarts would be the same
+               clustering), so the other restarts are initialized by
+               'seeding'
+    """
+    options = arguments[-1]
+    if restart == 0 or options is None or\
+            not options.get('warm_start', False):
+        return arguments
+    options = dict(options)
+    options['warm_start'] = False
+    return arguments[: -1] + (options,)
+
+
+def process_pool(processes):
+    """
+    input: processes int, number of processes
+    output: pool multiprocessing.Pool, pool of forked processes
+    uses: mp.get_context(), mp.Pool()
+    objective: to create pool of processes, that inherit _shared_arguments
+               (processes have to be forked)
+    """
+    if hasattr(mp, 'get_context'):
+        return mp.get_context('fork').Pool(processes)
+    return mp.Pool(processes)
+
+
 def iteration_step(training_data, input_coordinates, structure, C_old, U_old,
                    k, shape_of_grid, time_frame_sums, T, W, ES,
-                   valid_timesteps, evaluation_dataset, edges_of_cell):
+                   valid_timesteps, evaluation_dataset, edges_of_cell,
+                   basis=None, options=None):
     """
     input: path string, path to file
            input_coordinates numpy array, coordinates for model creation
@@ -300,6 +550,8 @@ def iteration_step(training_data, input_coordinates, structure, C_old, U_old,
            T numpy array shape_of_grid[0]x1, time positions of timeframes
            W numpy array Lx1, sequence of reasonable frequencies
            ES float64, squared sum of squares of residues from this iteration
+           basis list, precomputed phasors for fm.chosen_period() (or None)
+           options dict, optional settings of learning (see above)
     output: dES float64, difference between last and new error
             structure list(int, list(floats), list(floats)),
                       number of non-hypertime dimensions, list of hypertime
@@ -315,21 +567,24 @@ def iteration_step(training_data, input_coordinates, structure, C_old, U_old,
             P float64, length of the most influential frequency in default
                        units
     uses: mdl.model_creation(), fm.chosen_period()
-          np.sum()
     objective:
     """
+    if options is None:
+        options = {}
+    peaks = options.get('refined_peaks', 0)
+    tolerance = options.get('refinement_tolerance', 1e-3)
     #### testuji zmenu "sily" period pri pridavani shluku
-    hist_freqs, C, U, COV, density_integrals =\
+    # only sums over timeframes are needed, the histogram is not created
+    time_frame_freqs, C, U, COV, density_integrals =\
         mdl.model_creation(input_coordinates,
                            structure, training_data, C_old, U_old, k,
-                           shape_of_grid)
-    osy = tuple(np.arange(len(np.shape(hist_freqs)) - 1) + 1)
-    time_frame_freqs = np.sum(hist_freqs, axis=osy)
+                           shape_of_grid, options, marginal=True)
     P, W, ES, sum_of_amplitudes = fm.chosen_period(T, time_frame_sums,
                                                    time_frame_freqs, W, ES,
-                                                   valid_timesteps)
+                                                   valid_timesteps, basis,
+                                                   peaks, tolerance)
     diff = ev.evaluation_step(evaluation_dataset, C, COV, density_integrals,\
-                                      structure, k, edges_of_cell)
+                                      structure, k, edges_of_cell, options)
     #### konec testovani
     #print('chosen k: ' + str(k))
     #print('and the diff: ' + str(diff))
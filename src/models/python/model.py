@@ -4,7 +4,7 @@
 """
 returns model parameters and histogram above time-space
 call model_creation(input_coordinates, structure, path, C_old,
-                    U_old, k, shape_of_grid)
+                    U_old, k, shape_of_grid, options, marginal)
 where
 input: input_coordinates numpy array, coordinates for model creation
        structure list(int, list(floats), list(floats)),
@@ -16,10 +16,16 @@ input: input_coordinates numpy array, coordinates for model creation
        k positive integer, number of clusters
        shape_of_grid numpy array dx1 int64, number of cells in every
                                             dimension
+       options dict, optional settings of learning (see learning.py)
+       marginal bool, if True, only sums over timeframes are returned
 and
 output: hist_freqs numpy array (shape_of_grid), multidimensional histogram
                                                 of frequencies(stat) of
                                                 a model over the grid
+                                                (time_frame_freqs numpy
+                                                array shape_of_grid[0]x1,
+                                                its sums over timeframes,
+                                                if marginal)
         C numpy array kxd, matrix of k d-dimensional cluster centres
         U numpy array kxn, matrix of weights
         COV numpy array kxdxd, matrix of covariance matrices
@@ -31,13 +37,37 @@ output: hist_freqs numpy array (shape_of_grid), multidimensional histogram
 import dataset_io as dio
 import clustering as cl
 import numpy as np
-import gc
+import sys
+from multiprocessing.pool import ThreadPool
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# bytes of temporary arrays for one part of the grid in frequencies()
+# and coordinates_densities(), larger parts do not make it faster (they
+# do not fit into caches)
+MEMORY_BUDGET = int(1.6e7)
+# step of tables of time-only models in the units of time, the largest
+# number of their entries and number of points inside every step, where
+# the error of interpolation is measured (see periodic_table()), tables
+# with larger error bound than TABLE_TOLERANCE (in units of estimates)
+# are not used
+TABLE_RESOLUTION = 60.0
+TABLE_LIMIT = int(1e7)
+TABLE_CHECKS = 7
+TABLE_TOLERANCE = 0.01
+# number of randomly shifted lattices of sampled_densities(), the error
+# is estimated from differences between them
+DENSITY_SHIFTS = 8
 
 
 def model_creation(input_coordinates, structure, data, C_old, U_old, k,
-                   shape_of_grid):
+                   shape_of_grid, options=None, marginal=False):
     """
     input: input_coordinates numpy array, coordinates for model creation
+                                          (or grid.LazyGrid)
            structure list(int, list(floats), list(floats)),
                       number of non-hypertime dimensions, list of hypertime
                       radii nad list of wavelengths
@@ -47,32 +77,94 @@ def model_creation(input_coordinates, structure, data, C_old, U_old, k,
            k positive integer, number of clusters
            shape_of_grid numpy array dx1 int64, number of cells in every
                                                 dimension
+           options dict, optional settings of learning (see learning.py)
+           marginal bool, if True, frequencies(stat) are summed over
+                          timeframes part by part and the histogram is
+                          not created
     output: hist_freqs numpy array (shape_of_grid), multidimensional histogram
                                                     of frequencies(stat) of
                                                     a model over the grid
+                                                    (time_frame_freqs numpy
+                                                    array shape_of_grid[0]x1,
+                                                    its sums over timeframes,
+                                                    if marginal)
             C numpy array kxd, matrix of k d-dimensional cluster centres
             U numpy array kxn, matrix of weights
             COV numpy array kxdxd, matrix of covariance matrices
             density_integrals numpy array kx1, matrix of ratios between
                                                measurements and grid cells
                                                belonging to the clusters
-    uses: model_parameters(), coordinates_densities(), frequencies()
-          np.reshape()
+    uses: model_parameters(), precision_factors(), dio.phase_classes(),
+          grid.LazyGrid.phase_classes(), dio.is_numpy_array(),
+          coordinates_densities(), sampled_densities(), frequencies(),
+          class_frame_sums(), np.reshape(), np.max(), np.prod(),
+          np.repeat()
     objective: to create grid of frequencies(stat) over time-space (histogram),
                pass centres and weights to the next clusters initialization,
                and return model parameters (C, COV, density_integrals)
     """
-    C, U, COV, densities = model_parameters(data, structure, C_old, U_old, k)
-    grid_densities = coordinates_densities(input_coordinates, C, COV,
-                                           structure, k)
+    if options is None:
+        options = {}
+    phases = options.get('phases', False)
+    memory_budget = options.get('memory_budget', MEMORY_BUDGET)
+    threads = options.get('threads', None)
+    C, U, COV, densities = model_parameters(data, structure, C_old, U_old, k,
+                                            options)
+    # factorisations are shared by both passes over the grid
+    factors = precision_factors(COV)
+    # rows are ordered by time, every timeframe has the same number of cells
+    cells_of_frame = int(np.prod(shape_of_grid[0][1:]))
+    resolution = options.get('phase_resolution', None)
+    frame_inverse = None
+    if resolution is None:
+        grid_coordinates = input_coordinates
+        counts = None
+    elif dio.is_numpy_array(input_coordinates):
+        # cells with the same phases are evaluated once
+        grid_coordinates, inverse, counts =\
+            dio.phase_classes(input_coordinates, structure, resolution)
+    else:  # timeframes of the lazy grid with the same phases
+        grid_coordinates, frame_inverse, frame_counts =\
+            input_coordinates.phase_classes(structure, resolution)
+        counts = np.repeat(frame_counts, cells_of_frame)
+    samples = options.get('density_samples', None)
+    if samples is None:
+        grid_densities = coordinates_densities(grid_coordinates, C, COV,
+                                               structure, k, phases, factors,
+                                               memory_budget, threads, counts)
+    else:  # without the sweep over the whole grid
+        grid_densities, errors =\
+            sampled_densities(input_coordinates, shape_of_grid, C, COV,
+                              structure, k, samples, phases, factors,
+                              memory_budget)
+        print('relative error of sampled grid densities: ' +
+              str(np.max(errors)))
     density_integrals = densities / grid_densities
-    freqs = frequencies(input_coordinates, C, COV,
-                        structure, k, density_integrals)
+    if marginal and (resolution is None or frame_inverse is not None):
+        time_frame_freqs = frequencies(grid_coordinates, C, COV,
+                                       structure, k, density_integrals,
+                                       phases, factors, memory_budget,
+                                       threads, cells_of_frame)
+        if frame_inverse is not None:
+            time_frame_freqs = time_frame_freqs[frame_inverse]
+        return time_frame_freqs, C, U, COV, density_integrals
+    freqs = frequencies(grid_coordinates, C, COV,
+                        structure, k, density_integrals, phases, factors,
+                        memory_budget, threads)
+    if marginal:  # frequencies of phase classes are summed over timeframes
+        time_frame_freqs = class_frame_sums(freqs, inverse, cells_of_frame,
+                                            k, structure, memory_budget,
+                                            phases)
+        return time_frame_freqs, C, U, COV, density_integrals
+    if frame_inverse is not None:
+        freqs = freqs.reshape(-1, cells_of_frame)[frame_inverse]
+    elif resolution is not None:
+        freqs = freqs[inverse]
     hist_freqs = freqs.reshape(shape_of_grid[0])
     return hist_freqs, C, U, COV, density_integrals
 
 
-def model_parameters(data, structure, C_old, U_old, k):
+def model_parameters(data, structure, C_old, U_old, k, options=None):
     """
     input: path string, path to file
            structure list(int, list(floats), list(floats)),
@@ -81,62 +173,110 @@ def model_parameters(data, structure, C_old, U_old, k):
            C_old numpy array kxd, centres from last iteration
            U_old numpy array nxd, weights from last iteration
            k positive integer, number of clusters
+           options dict, optional settings of learning (see learning.py),
+                         'block_size', 'seeding', 'warm_start',
+                         'accelerated', 'collapse', 'mini_batch',
+                         'mini_batch_iterations', 'mini_batch_forgetting'
+                         and 'phases' are used here
     output: C numpy array kxd, matrix of k d-dimensional cluster centres
-            U numpy array kxn, matrix of weights
+            U numpy array kxn, matrix of weights (None if clustering
+                                                  was processed in blocks,
+                                                  kxm if observations were
+                                                  collapsed)
             COV numpy array kxdxd, matrix of covariance matrices
             densities numpy array kx1, matrix of number of measurements
                                        belonging to every cluster
-    uses: dio.create_X(), cl.k_means(), covariance_matrices()
+    uses: dio.projection(), dio.X_to_phases(),
+          dio.phases_to_X(), dio.collapse_points(), cl.k_means(),
+          covariance_matrices()
     objective: to find model parameters
     """
-    X = dio.create_X(data, structure)
-    # test to find out if clusters are known from previous clustering
-    try:
-        len(U_old)
-        ##### POKUS !!!
-        #used_method = 'stable_init'  # originaly 'prev_dim'
-        used_method = 'random'
-        ##### KONEC POKUSU !!!
-    except TypeError:
-        used_method = 'random'
+    if options is None:
+        options = {}
+    block_size = options.get('block_size', 0)
+    seeding = options.get('seeding', 'random')
+    accelerated = options.get('accelerated', True)
+    batch_size = options.get('mini_batch', 0)
+    forgetting = options.get('mini_batch_forgetting', 1.0)
+    if batch_size > 0:
+        iterations = options.get('mini_batch_iterations', 100)
+    else:
+        iterations = 100
+    phases = options.get('phases', False)
+    # clustering in the phase representation returns centres in the usual
+    # one (they lie on circles)
+    X = dio.projection(data, structure, phases)
+    if phases and np.ndim(C_old) == 2:
+        C_old = dio.X_to_phases(C_old, structure)
+    collapse = options.get('collapse', None)
+    if collapse is None:
+        weights = None
+    else:
+        X, weights = dio.collapse_points(X, collapse)
+    # warm start needs centres from previous clustering in a subspace of X
+    if options.get('warm_start', False) and np.ndim(C_old) == 2 and\
+            np.shape(C_old)[1] <= np.shape(X)[1]:
+        used_method = 'warm_start'
+    else:
+        used_method = seeding
     #print('type of initialization for clustering: ' + used_method)
     C, U, densities = cl.k_means(X, k, structure,
                                  method=used_method,
                                  version='hard',  # weight calculation
                                  fuzzyfier=1,  # weighting exponent
-                                 iterations=100,
-                                 C_in=C_old, U_in=U_old)
-    COV = covariance_matrices(X, C, U, structure)
+                                 iterations=iterations,
+                                 C_in=C_old, U_in=U_old,
+                                 block_size=block_size,
+                                 accelerated=accelerated,
+                                 weights=weights,
+                                 batch_size=batch_size,
+                                 forgetting=forgetting,
+                                 phases=phases)
+    COV = covariance_matrices(X, C, U, structure, block_size, weights,
+                              phases)
+    if phases:
+        C = dio.phases_to_X(C, structure)
     return C, U, COV, densities
 
 
-def covariance_matrices(X, C, U, structure):
+def covariance_matrices(X, C, U, structure, block_size=0, weights=None,
+                        phases=False):
     """
     input: X numpy array nxd, matrix of n d-dimensional observations
            C numpy array kxd, matrix of k d-dimensional cluster centres
-           U numpy array kxn, matrix of weights
+           U numpy array kxn, matrix of weights (not used)
            structure list(int, list(floats), list(floats)),
                       number of non-hypertime dimensions, list of hypertime
                       radii nad list of wavelengths
+           block_size int, if positive and smaller than n, X is processed
+                           in blocks of block_size observations
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+           phases bool, if True, X and C are in the phase representation
     output: COV numpy array kxdxd, matrix of covariance matrices
-    uses: cl.distance_matrix(), cl.partition_matrix()
-          np.shape(), np.tile(), np.cov(), np.linalg.inv(), np.array()
+    uses: dio.hypertime_differences(), dio.phase_differences(),
+          np.shape(), np.cov(), np.linalg.inv(), np.array(),
+          blocked_covariance_matrices()
     objective: to calculate covariance matrices for model
     """
-    k, n = np.shape(U)
-    D = cl.distance_matrix(X, C, U, structure)
+    k = np.shape(C)[0]
+    n = np.shape(X)[0]
+    if block_size > 0 and n > block_size:
+        return blocked_covariance_matrices(X, C, structure, block_size,
+                                           weights, phases)
     ## not pure fuzzy W :)
+    #D = cl.distance_matrix(X, C, U, structure)
     #W = cl.partition_matrix(D, version='fuzzy')
     ## W with binary memberships from U
     #W = W * U
+    if phases:
+        XC = dio.phase_differences(X, C, structure)
+    else:
+        XC = dio.hypertime_differences(X, C, structure)
     COV = []
     for cluster in range(k):
-        C_cluster = np.tile(C[cluster, :], (n, 1))
-        XC = dio.hypertime_substraction(X, C_cluster, structure)
-        #XC = X - C_cluster
-        #V = np.cov(XC, aweights=W[cluster, :], ddof=0, rowvar=False)
-        #V = np.cov(XC, ddof=0, rowvar=False)  # puvodni, melo by byt stejne
-        V = np.cov(XC, bias=True, rowvar=False)
+        #V = np.cov(XC[cluster], aweights=W[cluster, :], ddof=0, rowvar=False)
+        V = np.cov(XC[cluster], bias=True, rowvar=False, aweights=weights)
         if len(np.shape(V)) == 2:
             Vinv = np.linalg.inv(V)
         else:
@@ -147,44 +287,194 @@ def covariance_matrices(X, C, U, structure):
     return COV
 
 
-def coordinates_densities(input_coordinates, C, COV, structure, k):
+def blocked_covariance_matrices(X, C, structure, block_size, weights=None,
+                                phases=False):
+    """
+    input: X numpy array nxd, matrix of n d-dimensional observations
+           C numpy array kxd, matrix of k d-dimensional cluster centres
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           block_size positive integer, number of observations in one block
+           weights numpy array n, numbers of occurences of observations
+                                  (or None, every observation once)
+           phases bool, if True, X and C are in the phase representation
+    output: COV numpy array kxdxd, matrix of covariance matrices
+    uses: dio.hypertime_differences(), dio.phase_differences(),
+          np.shape(), np.zeros(), np.sum(), np.matmul(), np.einsum(),
+          np.linalg.inv()
+    objective: to calculate the same matrices as covariance_matrices(),
+               the first and second moments of substractions are accumulated
+               over blocks of X
+    """
+    n = np.shape(X)[0]
+    k = np.shape(C)[0]
+    width = structure[0] + len(structure[1])
+    first_moments = np.zeros((k, width))
+    second_moments = np.zeros((k, width, width))
+    for start in range(0, n, block_size):
+        if phases:
+            XC = dio.phase_differences(X[start: start + block_size], C,
+                                       structure)
+        else:
+            XC = dio.hypertime_differences(X[start: start + block_size], C,
+                                           structure)
+        if weights is None:
+            XCw = XC
+        else:
+            XCw = XC * weights[start: start + block_size, np.newaxis]
+        first_moments += np.sum(XCw, axis=1)
+        second_moments += np.matmul(XCw.transpose(0, 2, 1), XC)
+    if weights is not None:
+        n = np.sum(weights)
+    means = first_moments / n
+    V = second_moments / n - np.einsum('ki,kj->kij', means, means)
+    COV = np.linalg.inv(V)
+    return COV
+
+
+def coordinates_densities(input_coordinates, C, COV, structure, k,
+                          phases=False, factors=None, memory_budget=None,
+                          threads=None, weights=None):
     """
     input: input_coordinates numpy array, coordinates for model creation
+                                          (or grid.LazyGrid, its parts
+                                          are projected without the cache)
            C numpy array kxd, matrix of k d-dimensional cluster centres
            COV numpy array kxdxd, matrix of covariance matrices
            structure list(int, list(floats), list(floats)),
                       number of non-hypertime dimensions, list of hypertime
                       radii nad list of wavelengths
            k positive integer, number of clusters
+           phases bool, if True, the phase representation is used
+                        (centres have to lie on circles)
+           factors numpy array kxdxd, Cholesky factors of COV (or None,
+                                      then they are computed here)
+           memory_budget int, bytes of temporary arrays for one part
+                              of input_coordinates (None for MEMORY_BUDGET)
+           threads int, number of threads evaluating parts at once
+                        (None or 1 for evaluation without threads)
+           weights numpy array n, numbers of cells represented by rows
+                                  of input_coordinates (or None)
     output: grid_densities numpy array kx1, number of cells belonging to the
                                             clusters
-    uses: iter_over_coordinates()
-          np.shape(), np.zeros(), np.empty(), gc.collect()
+    uses: grid_parts(), evaluate_parts(), iter_over_coordinates(),
+          precision_factors(), dio.X_to_phases(), dio.is_numpy_array(),
+          np.shape(), np.zeros()
     objective: to call iter_over_coordinates() above smaller parts
-               of input_coordinates (every part of (5e7 / k) lines)
+               of input_coordinates (parts fitting into memory_budget,
+               temporary arrays are shared by parts of one thread)
                and to find out the number of cells belonging to the clusters
     """
-    number_of_coordinates = np.shape(input_coordinates)[0]
-    volume_of_data = number_of_coordinates * k
-    number_of_parts = (volume_of_data // int(5e7)) + 1
-    length_of_part = number_of_coordinates // (number_of_parts)
-    finish = 0
+    parts, length_of_part = grid_parts(np.shape(input_coordinates)[0], k,
+                                       structure, memory_budget, phases)
+    if phases:
+        C = dio.X_to_phases(C, structure)
+    if factors is None:
+        factors = precision_factors(COV)
+    cache = dio.is_numpy_array(input_coordinates)
+
+    def evaluate_part(start, finish, workspace):
+        if weights is None:
+            weights_part = None
+        else:
+            weights_part = weights[start: finish]
+        return iter_over_coordinates(input_coordinates[start: finish, :], C,
+                                     COV, structure, k, phases, factors,
+                                     workspace, weights_part, cache)
     grid_densities = np.zeros((k, 1))
-    for i in range(number_of_parts):
-        start = i * length_of_part
-        finish = (i + 1) * length_of_part - 1
-        grid_densities_part =\
-            iter_over_coordinates(input_coordinates[start: finish, :], C, COV,
-                                  structure, k)
+    # sums of parts are added in the same order for any number of threads
+    for grid_densities_part in evaluate_parts(evaluate_part, parts,
+                                              length_of_part, k, structure,
+                                              threads):
         grid_densities += grid_densities_part
-        gc.collect()
-    grid_densities_part = iter_over_coordinates(input_coordinates[finish:, :],
-                                                C, COV, structure, k)
-    grid_densities += grid_densities_part
     return grid_densities
 
 
-def iter_over_coordinates(input_coordinates_part, C, COV, structure, k):
+def sampled_densities(input_coordinates, shape_of_grid, C, COV, structure,
+                      k, samples, phases=False, factors=None,
+                      memory_budget=None):
+    """
+    input: input_coordinates numpy array, coordinates for model creation
+                                          (cartesian product of axes
+                                          of the grid, or grid.LazyGrid)
+           shape_of_grid numpy array dx1 int64, number of cells in every
+                                                dimension
+           C numpy array kxd, matrix of k d-dimensional cluster centres
+           COV numpy array kxdxd, matrix of covariance matrices
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           k positive integer, number of clusters
+           samples int, number of sampled cells
+           phases bool, if True, the phase representation is used
+                        (centres have to lie on circles)
+           factors numpy array kxdxd, Cholesky factors of COV (or None,
+                                      then they are computed here)
+           memory_budget int, bytes of temporary arrays for one part
+                              of samples (None for MEMORY_BUDGET)
+    output: grid_densities numpy array kx1, estimated number of cells
+                                            belonging to the clusters
+            errors numpy array kx1, estimated relative (standard) errors
+                                    of grid_densities
+    uses: coordinates_densities(), precision_factors(), grid_parts(),
+          dio.create_X(), dio.create_phases(), dio.X_to_phases(),
+          mahalanobis_distances(), squared_model_weights(),
+          np.ravel_multi_index(), np.random.RandomState()
+    objective: to estimate the result of coordinates_densities() from
+               a quasi-Monte-Carlo sample of cells, the sample is
+               the rank-1 lattice (generalised golden ratio sequence) over
+               axes of the grid, DENSITY_SHIFTS times randomly shifted
+               (with a fixed seed), the estimate is the mean of them and
+               the error is estimated from their differences; projections
+               of samples are not cached
+    """
+    axes = np.array(shape_of_grid[0], dtype=np.int64)
+    number_of_cells = np.prod(axes)
+    if samples >= number_of_cells:
+        return coordinates_densities(input_coordinates, C, COV, structure, k,
+                                     phases, factors, memory_budget),\
+            np.zeros((k, 1))
+    if phases:
+        C = dio.X_to_phases(C, structure)
+    if factors is None:
+        factors = precision_factors(COV)
+    dimension = len(axes)
+    # the generalised golden ratio, the root of x ** (dimension + 1) = x + 1
+    ratio = 2.0
+    for iteration in range(30):
+        ratio = (1 + ratio) ** (1.0 / (dimension + 1))
+    steps = (1.0 / ratio) ** np.arange(1, dimension + 1)
+    length = max(1, samples // DENSITY_SHIFTS)
+    lattice = np.outer(np.arange(1, length + 1), steps)
+    shifts = np.random.RandomState(0).rand(DENSITY_SHIFTS, dimension)
+    estimates_of_shifts = np.empty((DENSITY_SHIFTS, k))
+    for shift in range(DENSITY_SHIFTS):
+        points = lattice + shifts[shift]
+        points -= np.floor(points)
+        indices = np.minimum((points * axes).astype(np.int64), axes - 1)
+        rows = np.ravel_multi_index(tuple(indices.T), tuple(axes))
+        sums = np.zeros(k)
+        for start, finish in grid_parts(length, k, structure,
+                                        memory_budget, phases)[0]:
+            coordinates = input_coordinates[rows[start: finish]]
+            if phases:
+                X = dio.create_phases(coordinates, structure)
+            else:
+                X = dio.create_X(coordinates, structure)
+            D = mahalanobis_distances(X, C, COV, structure, phases, factors)
+            sums += np.sum(squared_model_weights(D), axis=1)
+        estimates_of_shifts[shift] = sums * (number_of_cells /
+                                             float(length))
+    grid_densities = np.mean(estimates_of_shifts, axis=0).reshape(-1, 1)
+    errors = np.std(estimates_of_shifts, axis=0, ddof=1).reshape(-1, 1) /\
+        np.sqrt(DENSITY_SHIFTS) / grid_densities
+    return grid_densities, errors
+
+
+def iter_over_coordinates(input_coordinates_part, C, COV, structure, k,
+                          phases=False, factors=None, workspace=None,
+                          weights_part=None, cache=True):
     """
     input: input_coordinates_part numpy array, coordinates for model creation
            C numpy array kxd, matrix of k d-dimensional cluster centres
@@ -193,38 +483,37 @@ def iter_over_coordinates(input_coordinates_part, C, COV, structure, k):
                       number of non-hypertime dimensions, list of hypertime
                       radii nad list of wavelengths
            k positive integer, number of clusters
+           phases bool, if True, C is in the phase representation
+           factors numpy array kxdxd, Cholesky factors of COV (or None)
+           workspace tuple, buffers from evaluation_workspace() (or None)
+           weights_part numpy array len(input_coordinates_part), numbers
+                                   of cells represented by rows (or None)
+           cache bool, if False, the part is projected without the cache
     output: grid_densities_part numpy array kx1, number of part of cells
                                                  belonging to the clusters
-    uses: dio.create_X(), np.shape(), gc.collect(), np.tile(),
-          np.sum(), np.dot(), np.array(),
-          cl.partition_matrix()
+    uses: dio.projection(), np.sum(),
+          mahalanobis_distances(), squared_model_weights()
     objective: to find out the number of cells (part of them) belonging to
                the clusters
     """
-    X = dio.create_X(input_coordinates_part, structure)
-    n, d = np.shape(X)
-    gc.collect()
-    D = []
-    for cluster in range(k):
-        C_cluster = np.tile(C[cluster, :], (n, 1))
-        XC = dio.hypertime_substraction(X, C_cluster, structure)
-        #XC = X - C_cluster
-        VI = COV[cluster]#COV[cluster, :, :]
-        D.append(np.sum(np.dot(XC, VI) * XC, axis=1))
-        gc.collect()
-    D = np.array(D)
-    gc.collect()
-    U = cl.partition_matrix(D, version='model')
-    U = U ** 2
-    gc.collect()
+    X = dio.projection(input_coordinates_part, structure, phases, cache)
+    D = mahalanobis_distances(X, C, COV, structure, phases, factors,
+                              workspace)
+    U = squared_model_weights(D, workspace)
+    if weights_part is not None:
+        U *= weights_part
     grid_densities_part = np.sum(U, axis=1, keepdims=True)
     return grid_densities_part
 
 
 def frequencies(input_coordinates, C, COV, structure, k,
-                density_integrals):
+                density_integrals, phases=False, factors=None,
+                memory_budget=None, threads=None, cells_of_frame=None,
+                cache=None):
     """
     input: input_coordinates numpy array, coordinates for model creation
+                                          (or grid.LazyGrid, its parts
+                                          are projected without the cache)
            C numpy array kxd, matrix of k d-dimensional cluster centres
            COV numpy array kxdxd, matrix of covariance matrices
            structure list(int, list(floats), list(floats)),
@@ -234,42 +523,78 @@ def frequencies(input_coordinates, C, COV, structure, k,
            density_integrals numpy array kx1, matrix of ratios between
                                                measurements and grid cells
                                                belonging to the clusters
+           phases bool, if True, the phase representation is used
+                        (centres have to lie on circles)
+           factors numpy array kxdxd, Cholesky factors of COV (or None,
+                                      then they are computed here)
+           memory_budget int, bytes of temporary arrays for one part
+                              of input_coordinates (None for MEMORY_BUDGET)
+           threads int, number of threads evaluating parts at once
+                        (None or 1 for evaluation without threads)
+           cells_of_frame int, number of consecutive rows of one timeframe
+                               (None for frequencies of all rows)
+           cache bool, if False, parts are projected without the cache
+                       (None for the cache of numpy arrays only, grids
+                       created for one use should not be cached)
     output: freqs numpy array len(input_coordinates_part)x1,
                                            frequencies(stat) obtained
                                            from model in positions
                                            of input_coordinates
-    uses: iter_over_freqs()
-          np.shape(), np.zeros(), np.empty(), gc.collect(), np.reshape()
+                                           (or sums of frequencies(stat)
+                                           over timeframes, if
+                                           cells_of_frame is given)
+    uses: grid_parts(), evaluate_parts(), iter_over_freqs(),
+          precision_factors(), dio.X_to_phases(), dio.is_numpy_array(),
+          np.shape(), np.empty(), frame_sums_of_part(), frame_sums()
     objective: to call iter_over_freqs() above smaller parts
-               of input_coordinates (every part of (5e7 / k) lines)
+               of input_coordinates (parts fitting into memory_budget,
+               temporary arrays are shared by parts of one thread)
                and to create grid of frequencies(stat) over time-space
-               (histogram)
+               (histogram), or only its sums over timeframes without
+               the grid of frequencies(stat)
     """
     number_of_coordinates = np.shape(input_coordinates)[0]
-    volume_of_data = number_of_coordinates * k
-    number_of_parts = (volume_of_data // int(5e7)) + 1
-    length_of_part = number_of_coordinates // (number_of_parts)
-    finish = 0
+    parts, length_of_part = grid_parts(number_of_coordinates, k, structure,
+                                       memory_budget, phases)
+    if phases:
+        C = dio.X_to_phases(C, structure)
+    if factors is None:
+        factors = precision_factors(COV)
+    if cache is None:
+        cache = dio.is_numpy_array(input_coordinates)
+    if cells_of_frame is not None:
+
+        def evaluate_frames(start, finish, workspace):
+            # sums of timeframes touched by the part, added up later
+            return frame_sums_of_part(
+                iter_over_freqs(input_coordinates[start: finish, :],
+                                C, COV, structure, k,
+                                density_integrals, phases, factors,
+                                workspace, cache),
+                start, cells_of_frame)
+        return frame_sums(evaluate_parts(evaluate_frames, parts,
+                                         length_of_part, k, structure,
+                                         threads),
+                          number_of_coordinates // cells_of_frame)
     freqs = np.empty(number_of_coordinates)
-    for i in range(number_of_parts):
-        start = i * length_of_part
-        finish = (i + 1) * length_of_part - 1
-        freqs_part = iter_over_freqs(input_coordinates[start: finish, :],
-                                     C, COV, structure, k,
-                                     density_integrals)
-        freqs[start: finish] = freqs_part
-        gc.collect()
-    freqs_part = iter_over_freqs(input_coordinates[finish:, :],
-                                 C, COV, structure, k,
-                                 density_integrals)
-    freqs[finish:] = freqs_part
+
+    def evaluate_part(start, finish, workspace):
+        # parts are disjoint, threads do not write into the same cells
+        freqs[start: finish] =\
+            iter_over_freqs(input_coordinates[start: finish, :],
+                            C, COV, structure, k,
+                            density_integrals, phases, factors, workspace,
+                            cache)
+    evaluate_parts(evaluate_part, parts, length_of_part, k, structure,
+                   threads)
 #    hist_freqs = freqs.reshape(shape_of_grid)
 #    return hist_freqs
     return freqs
 
 
 def iter_over_freqs(input_coordinates_part, C, COV, structure, k,
-                    density_integrals):
+                    density_integrals, phases=False, factors=None,
+                    workspace=None, cache=True):
     """
     input: input_coordinates_part numpy array, coordinates for model creation
            C numpy array kxd, matrix of k d-dimensional cluster centres
@@ -281,37 +606,302 @@ def iter_over_freqs(input_coordinates_part, C, COV, structure, k,
            density_integrals numpy array kx1, matrix of ratios between
                                                measurements and grid cells
                                                belonging to the clusters
+           phases bool, if True, C is in the phase representation
+           factors numpy array kxdxd, Cholesky factors of COV (or None)
+           workspace tuple, buffers from evaluation_workspace() (or None)
+           cache bool, if False, the part is projected without the cache
     output: freqs_part numpy array len(input_coordinates_part)x1,
                                            frequencies(stat) obtained
                                            from model in positions of part
                                            of input_coordinates
-    uses: dio.create_X(), np.shape(), gc.collect(), np.tile(),
-          np.sum(), np.dot(), np.array(),
-          cl.partition_matrix()
+    uses: dio.projection(), np.sum(),
+          mahalanobis_distances(), squared_model_weights()
     objective: to create grid of frequencies(stat) over a part time-space
                (histogram)
     """
-    X = dio.create_X(input_coordinates_part, structure)
-    n, d = np.shape(X)
-    D = []
-    for cluster in range(k):
-        C_cluster = np.tile(C[cluster, :], (n, 1))
-        XC = dio.hypertime_substraction(X, C_cluster, structure)
-        #XC = X - C_cluster
-        VI = COV[cluster]#COV[cluster, :, :]
-        D.append(np.sum(np.dot(XC, VI) * XC, axis=1))
-        gc.collect()
-    D = np.array(D)
-    gc.collect()
-    U = cl.partition_matrix(D, version='model')
-    U = (U ** 2) * density_integrals
-    gc.collect()
+    X = dio.projection(input_coordinates_part, structure, phases, cache)
+    D = mahalanobis_distances(X, C, COV, structure, phases, factors,
+                              workspace)
+    U = squared_model_weights(D, workspace)
+    U *= density_integrals
     freqs_part = np.sum(U, axis=0)
     return freqs_part
 
 
+def frame_sums_of_part(freqs_part, start, cells_of_frame):
+    """
+    input: freqs_part numpy array, frequencies(stat) of consecutive rows
+                                   of the grid
+           start int, row of the first value of freqs_part
+           cells_of_frame int, number of consecutive rows of one timeframe
+    output: first_frame int, timeframe of the first value of freqs_part
+            sums numpy array, sums of freqs_part over the timeframes
+                              from first_frame on
+    uses: np.arange(), np.bincount()
+    objective: to sum a part of frequencies(stat) over timeframes, rows
+               of the grid are ordered by time (see grid.cartesian_product())
+    """
+    first_frame = start // cells_of_frame
+    frames = np.arange(start, start + len(freqs_part)) // cells_of_frame
+    frames -= first_frame
+    return first_frame, np.bincount(frames, weights=freqs_part)
+
+
+def frame_sums(sums_of_parts, number_of_frames):
+    """
+    input: sums_of_parts list(tuple(int, numpy array)), outputs
+                         of frame_sums_of_part() for all parts of the grid
+           number_of_frames int, number of timeframes
+    output: time_frame_freqs numpy array number_of_framesx1, sum
+                                         of frequencies(stat) over
+                                         timeframes
+    uses: np.zeros()
+    objective: to add up sums of parts, neighbouring parts can share
+               a timeframe
+    """
+    time_frame_freqs = np.zeros(number_of_frames)
+    for first_frame, sums in sums_of_parts:
+        time_frame_freqs[first_frame: first_frame + len(sums)] += sums
+    return time_frame_freqs
+
+
+def class_frame_sums(freqs, inverse, cells_of_frame, k, structure,
+                     memory_budget=None, phases=False):
+    """
+    input: freqs numpy array, frequencies(stat) of phase classes
+           inverse numpy array int, phase class of every row of the grid
+                                    (see dio.phase_classes())
+           cells_of_frame int, number of consecutive rows of one timeframe
+           k positive integer, number of clusters
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           memory_budget int, bytes of temporary arrays for one part
+                              of the grid (None for MEMORY_BUDGET)
+           phases bool, if True, the phase representation is used
+    output: time_frame_freqs numpy array, sum of frequencies(stat) over
+                                          timeframes
+    uses: grid_parts(), frame_sums_of_part(), frame_sums()
+    objective: to sum frequencies(stat) of rows over timeframes part
+               by part, without frequencies(stat) of the whole grid
+    """
+    parts = grid_parts(len(inverse), k, structure, memory_budget, phases)[0]
+    return frame_sums([frame_sums_of_part(freqs[inverse[start: finish]],
+                                          start, cells_of_frame)
+                       for start, finish in parts],
+                      len(inverse) // cells_of_frame)
+
+
+def grid_parts(number_of_coordinates, k, structure, memory_budget=None,
+               phases=False):
+    """
+    input: number_of_coordinates int, number of rows of the grid
+           k positive integer, number of clusters
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           memory_budget int, bytes of temporary arrays for one part
+                              (None for MEMORY_BUDGET)
+           phases bool, if True, the phase representation is used
+    output: parts list(tuple(int, int)), starts and ends of parts,
+                                         they cover all rows
+            length_of_part int, the largest number of rows in a part
+    uses: np.ceil()
+    objective: to split the grid into parts, whose projection and
+               temporary arrays of distances and weights take at most
+               memory_budget bytes (at least one row in a part)
+    """
+    if memory_budget is None:
+        memory_budget = MEMORY_BUDGET
+    dim = structure[0]
+    periods = len(structure[1])
+    if phases:
+        projected = dim + periods
+    else:
+        projected = dim + 2 * periods
+    # projection, substractions and their products with factors,
+    # temporary array, distances and mask of evaluation_workspace()
+    bytes_of_row = 8 * (projected + 2 * k * (dim + periods) + 2 * k) + k
+    length_of_part = int(max(1, min(memory_budget // bytes_of_row,
+                                    number_of_coordinates)))
+    number_of_parts = int(np.ceil(number_of_coordinates /
+                                  float(length_of_part)))
+    parts = [(part * length_of_part,
+              min((part + 1) * length_of_part, number_of_coordinates))
+             for part in range(number_of_parts)]
+    return parts, length_of_part
+
+
+def evaluation_workspace(length_of_part, k, structure):
+    """
+    input: length_of_part int, the largest number of rows in a part
+           k positive integer, number of clusters
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+    output: workspace tuple, flat buffers for substractions, temporary
+                             array of substractions, products with
+                             factors, distances and mask of distances
+    uses: np.empty()
+    objective: to allocate temporary arrays of mahalanobis_distances() and
+               squared_model_weights() once for all parts of the grid
+    """
+    size = k * length_of_part
+    width = structure[0] + len(structure[1])
+    return (np.empty(size * width), np.empty(size), np.empty(size * width),
+            np.empty(size), np.empty(size, dtype=bool))
+
+
+def evaluate_parts(evaluate_part, parts, length_of_part, k, structure,
+                   threads=None):
+    """
+    input: evaluate_part function, called as evaluate_part(start, finish,
+                                   workspace) for every part
+           parts list(tuple(int, int)), starts and ends of parts
+                                        (from grid_parts())
+           length_of_part int, the largest number of rows in a part
+           k positive integer, number of clusters
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           threads int, number of threads (None or 1 for evaluation
+                        without threads)
+    output: outputs list, outputs of evaluate_part() in the order of parts
+    uses: evaluation_workspace(), ThreadPool()
+    objective: to evaluate parts of the grid in parallel threads (numpy
+               releases GIL during the heavy work), every thread takes
+               every threads-th part and has its own workspace, so it
+               needs threads times memory_budget
+    """
+    if threads is None or threads <= 1 or len(parts) <= 1:
+        workspace = evaluation_workspace(length_of_part, k, structure)
+        return [evaluate_part(start, finish, workspace)
+                for start, finish in parts]
+    threads = min(threads, len(parts))
+
+    def evaluate_share(thread):
+        workspace = evaluation_workspace(length_of_part, k, structure)
+        return [evaluate_part(start, finish, workspace)
+                for start, finish in parts[thread::threads]]
+    pool = ThreadPool(threads)
+    try:
+        shares = pool.map(evaluate_share, range(threads))
+    finally:
+        pool.close()
+        pool.join()
+    outputs = [None] * len(parts)
+    for thread in range(threads):
+        outputs[thread::threads] = shares[thread]
+    return outputs
+
+
+def peak_memory():
+    """
+    input: None
+    output: peak float, the largest resident memory of the process in
+                        bytes so far (None if unknown)
+    uses: resource.getrusage()
+    objective: to report observed peak memory, so the memory_budget
+               can be set for the machine
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # bytes on macOS, kilobytes on Linux
+        return float(peak)
+    return peak * 1024.0
+
+
+def precision_factors(COV):
+    """
+    input: COV numpy array kxdxd, matrix of covariance matrices
+    output: factors numpy array kxdxd, lower triangular matrices L with
+                                       L L^T = COV for every cluster
+                                       (None if some of COV is not
+                                       positive definite)
+    uses: np.linalg.cholesky()
+    objective: to factorise precision matrices once per model, so that
+               the squared Mahalanobis distance is the squared norm of
+               (x - c) L
+    """
+    try:
+        return np.linalg.cholesky(COV)
+    except np.linalg.LinAlgError:
+        return None
+
+
+def mahalanobis_distances(X, C, COV, structure, phases=False, factors=None,
+                          workspace=None):
+    """
+    input: X numpy array nxd, matrix of n d-dimensional observations
+           C numpy array kxd, matrix of k d-dimensional cluster centres
+           COV numpy array kxdxd, matrix of covariance matrices
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           phases bool, if True, X and C are in the phase representation
+           factors numpy array kxdxd, Cholesky factors of COV
+                                      (or None, then COV is used directly)
+           workspace tuple, buffers from evaluation_workspace() for at
+                            least n rows (or None)
+    output: D numpy array kxn, matrix of squared Mahalanobis distances
+                               between every observation and every center
+                               (a view of workspace, if it is used)
+    uses: dio.hypertime_differences(), dio.phase_differences(),
+          np.shape(), np.empty(), np.matmul(), np.einsum()
+    objective: to find distances of all observations from all clusters
+               at once (hypertime substraction for every cluster)
+    """
+    n = np.shape(X)[0]
+    k = np.shape(C)[0]
+    width = structure[0] + len(structure[1])
+    if workspace is None:
+        XC = None
+        temporary = None
+        products = np.empty((k, n, width))
+        D = np.empty((k, n))
+    else:
+        XC = workspace[0][: k * n * width].reshape(k, n, width)
+        temporary = workspace[1][: k * n].reshape(k, n)
+        products = workspace[2][: k * n * width].reshape(k, n, width)
+        D = workspace[3][: k * n].reshape(k, n)
+    if phases:
+        XC = dio.phase_differences(X, C, structure, XC, temporary)
+    else:
+        XC = dio.hypertime_differences(X, C, structure, XC, temporary)
+    if factors is None:
+        np.matmul(XC, COV, out=products)
+        np.einsum('kni,kni->kn', products, XC, out=D)
+    else:
+        np.matmul(XC, factors, out=products)
+        np.einsum('kni,kni->kn', products, products, out=D)
+    return D
+
+
+def squared_model_weights(D, workspace=None):
+    """
+    input: D numpy array kxn, matrix of squared Mahalanobis distances
+           workspace tuple, buffers from evaluation_workspace() (or None)
+    output: U numpy array kxn, squared weights of the model (D is
+                               overwritten)
+    uses: np.shape(), np.less(), np.reciprocal(), np.multiply()
+    objective: to compute cl.partition_matrix(D, version='model') ** 2
+               in place, without temporary kxn arrays
+    """
+    if workspace is None:
+        inside = D < 1
+    else:
+        inside = workspace[4][: D.size].reshape(np.shape(D))
+        np.less(D, 1, out=inside)
+    D += np.exp(-100)
+    np.reciprocal(D, out=D)
+    D[inside] = 1
+    np.multiply(D, D, out=D)
+    return D
+
+
 def one_freq(one_input_coordinate, C, COV, structure, k,
-                    density_integrals):
+             density_integrals, factors=None):
     """
     input: one_input_coordinate numpy array, coordinates for model creation
            C numpy array kxd, matrix of k d-dimensional cluster centres
@@ -323,30 +913,303 @@ def one_freq(one_input_coordinate, C, COV, structure, k,
            density_integrals numpy array kx1, matrix of ratios between
                                                measurements and grid cells
                                                belonging to the clusters
+           factors numpy array kxdxd, Cholesky factors of COV (or None,
+                                      then they are computed here)
     output: freq array len(input_coordinates_part)x1,
                                            frequencies(stat) obtained
                                            from model in positions of part
                                            of input_coordinates
-    uses: dio.create_X(), np.shape(), gc.collect(), np.tile(),
-          np.sum(), np.dot(), np.array(),
-          cl.partition_matrix()
+    uses: dio.create_X(), precision_factors(), np.sum(),
+          mahalanobis_distances(), squared_model_weights()
     objective: to create grid of frequencies(stat) over a part time-space
                (histogram)
     """
     X = dio.create_X(one_input_coordinate, structure)
-    n, d = np.shape(X)
-    D = []
-    for cluster in range(k):
-        # C_cluster = np.tile(C[cluster, :], (n, 1))
-        XC = dio.hypertime_substraction(X, C[cluster:cluster+1], structure)
-        #XC = X - C[cluster]
-        VI = COV[cluster]#COV[cluster, :, :]
-        D.append(np.sum(np.dot(XC, VI) * XC, axis=1))
-        # gc.collect()
-    D = np.array(D)
-    # gc.collect()
-    U = cl.partition_matrix(D, version='model')
-    U = (U ** 2) * density_integrals
-    # gc.collect()
+    if factors is None:
+        factors = precision_factors(COV)
+    D = mahalanobis_distances(X, C, COV, structure, factors=factors)
+    U = squared_model_weights(D)
+    U *= density_integrals
     freq = np.sum(U, axis=0)
     return freq
+
+
+def estimates(coordinates, C, COV, structure, k, density_integrals,
+              factors=None):
+    """
+    input: coordinates numpy array nxd*, positions IRL (time in the first
+                                         column)
+           C numpy array kxd, matrix of k d-dimensional cluster centres
+           COV numpy array kxdxd, matrix of covariance matrices
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           k positive integer, number of clusters
+           density_integrals numpy array kx1, matrix of ratios between
+                                               measurements and grid cells
+                                               belonging to the clusters
+           factors numpy array kxdxd, Cholesky factors of COV (or None,
+                                      then they are computed here)
+    output: freqs numpy array n, frequencies(stat) obtained from model
+                                 in positions of coordinates
+    uses: precision_factors(), grid_parts(), one_freq(), np.empty()
+    objective: to evaluate the model in arbitrary positions in parts fitting
+               into MEMORY_BUDGET, projections are not cached (unlike
+               frequencies()), so the coordinates can be changed later
+    """
+    if factors is None:
+        factors = precision_factors(COV)
+    freqs = np.empty(len(coordinates))
+    for start, finish in grid_parts(len(coordinates), k, structure)[0]:
+        freqs[start: finish] = one_freq(coordinates[start: finish], C, COV,
+                                        structure, k, density_integrals,
+                                        factors)
+    return freqs
+
+
+def hyperperiod(wavelengths, longest_period, tolerance=1e-9):
+    """
+    input: wavelengths list(floats), lengths of periods
+           longest_period float, the longest acceptable common period
+           tolerance float, relative tolerance of multiples of periods
+    output: period float, the shortest common multiple of wavelengths
+                          (None if it is longer than longest_period)
+    uses: np.round()
+    objective: to find the period of a time-only model, multiples
+               of the longest wavelength are tested
+    """
+    longest = max(wavelengths)
+    for multiple in range(1, int(longest_period // longest) + 1):
+        period = multiple * longest
+        for wavelength in wavelengths:
+            cycles = period / wavelength
+            if abs(cycles - np.round(cycles)) > tolerance * cycles:
+                break
+        else:
+            return period
+    return None
+
+
+def periodic_table(C, COV, structure, k, density_integrals,
+                   resolution=None, limit=None):
+    """
+    input: C numpy array kxd, matrix of k d-dimensional cluster centres
+           COV numpy array kxdxd, matrix of covariance matrices
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           k positive integer, number of clusters
+           density_integrals numpy array kx1, matrix of ratios between
+                                               measurements and grid cells
+                                               belonging to the clusters
+           resolution float, step of the table in the units of time
+                             (None for TABLE_RESOLUTION)
+           limit int, the largest number of entries (None for TABLE_LIMIT)
+    output: table tuple(float, float, numpy array, float), period of
+                  the model, step, values of the model in multiples
+                  of the step over one period (and the first value again)
+                  and error bound (None for models with other than time
+                  dimensions, without periods or with too long period)
+    uses: hyperperiod(), estimates(), np.arange(), np.append(),
+          np.empty(), np.diff(), np.abs(), np.max()
+    objective: to tabulate a time-only model over its period, so it
+               can be estimated by table_estimates() in constant time;
+               the error bound is the largest difference between model
+               and linear interpolation in TABLE_CHECKS evenly spaced
+               points inside every step plus the largest change
+               of the model between neighbouring points
+    """
+    if resolution is None:
+        resolution = TABLE_RESOLUTION
+    if limit is None:
+        limit = TABLE_LIMIT
+    if structure[0] != 0 or len(structure[2]) == 0:
+        return None
+    period = hyperperiod(structure[2], resolution * limit)
+    if period is None:
+        return None
+    steps = int(np.ceil(period / resolution))
+    step = period / steps
+    nodes = np.arange(steps) * step
+    factors = precision_factors(COV)
+    values = estimates(nodes.reshape(-1, 1), C, COV, structure, k,
+                       density_integrals, factors)
+    values = np.append(values, values[0])
+    # weights of the model are not smooth (they are cut to one inside
+    # clusters), so the error is measured in TABLE_CHECKS points inside
+    # every step and the largest change of the model between neighbouring
+    # points is added (as the error can grow between them)
+    samples = np.empty((steps, TABLE_CHECKS + 2))
+    samples[:, 0] = values[: -1]
+    samples[:, -1] = values[1:]
+    error = 0.0
+    for check in range(1, TABLE_CHECKS + 1):
+        fraction = check / (TABLE_CHECKS + 1.0)
+        samples[:, check] = estimates((nodes + fraction * step).reshape(-1, 1),
+                                      C, COV, structure, k,
+                                      density_integrals, factors)
+        interpolated = values[: -1] * (1 - fraction) + values[1:] * fraction
+        error = max(error, np.max(np.abs(samples[:, check] - interpolated)))
+    error += np.max(np.abs(np.diff(samples, axis=1)))
+    return period, step, values, error
+
+
+def table_estimates(table, times):
+    """
+    input: table tuple, output of periodic_table()
+           times numpy array n, times for estimation
+    output: freqs numpy array n, frequencies(stat) interpolated from
+                                 the table
+    uses: np.mod(), np.floor(), np.minimum()
+    objective: to estimate the model in constant time (independent of
+               number of clusters and periods) by linear interpolation
+               of the table
+    """
+    period, step, values, error = table
+    positions = np.mod(times, period) / step
+    indices = np.minimum(np.floor(positions).astype(int),
+                         len(values) - 2)
+    fractions = positions - indices
+    return values[indices] * (1 - fractions) +\
+        values[indices + 1] * fractions
+
+
+class HyperTimeModel(object):
+    """
+    learned model with frozen parameters, call
+    HyperTimeModel(C, COV, density_integrals, structure, k, tabulate,
+                   table_resolution, table_tolerance)
+    where
+    input: C numpy array kxd, matrix of k d-dimensional cluster centres
+                              (or array with the average, if there is
+                              no model)
+           COV numpy array kxdxd, matrix of covariance matrices
+           density_integrals numpy array kx1, matrix of ratios between
+                                               measurements and grid cells
+                                               belonging to the clusters
+           structure list(int, list(floats), list(floats)),
+                      number of non-hypertime dimensions, list of hypertime
+                      radii nad list of wavelengths
+           k positive integer, number of clusters
+           tabulate bool, if True, time-only models are tabulated by
+                          periodic_table() (default True)
+           table_resolution float, step of the table (None for
+                                   TABLE_RESOLUTION)
+           table_tolerance float, the largest error bound of the table,
+                                  models with larger one are estimated
+                                  directly (None for TABLE_TOLERANCE)
+    and
+    predict(times) returns estimates in times, predict_grid(coordinates)
+    returns frequencies in positions of a grid and parameters() returns
+    the tuple (C, COV, density_integrals, structure, k)
+    """
+    __slots__ = ('C', 'COV', 'density_integrals', 'dim', 'radii',
+                 'wavelengths', 'k', 'factors', 'table')
+
+    def __init__(self, C, COV, density_integrals, structure, k,
+                 tabulate=True, table_resolution=None,
+                 table_tolerance=None):
+        """
+        input: see the class
+        output: None
+        uses: np.array(), np.ndarray.setflags(), precision_factors(),
+              periodic_table()
+        objective: to freeze parameters into contiguous read-only arrays
+                   and to precompute factors of precision matrices
+                   and the table, its error bound is printed and the table
+                   is dropped, if the bound is over the tolerance
+        """
+        self.C = np.array(C, dtype=float, order='C')
+        self.COV = np.array(COV, dtype=float, order='C')
+        self.density_integrals = np.array(density_integrals, dtype=float,
+                                          order='C')
+        self.dim = int(structure[0])
+        self.radii = np.array(structure[1], dtype=float)
+        self.wavelengths = np.array(structure[2], dtype=float)
+        self.k = int(k)
+        for parameter in (self.C, self.COV, self.density_integrals,
+                          self.radii, self.wavelengths):
+            parameter.setflags(write=False)
+        self.factors = None
+        self.table = None
+        if self.dim == 0 and len(self.radii) == 0:  # no model
+            return
+        self.factors = precision_factors(self.COV)
+        if tabulate:
+            self.table = periodic_table(self.C, self.COV, self.structure,
+                                        self.k, self.density_integrals,
+                                        table_resolution)
+        if self.table is not None:
+            if table_tolerance is None:
+                table_tolerance = TABLE_TOLERANCE
+            error = self.table[3]
+            print('table of the model with step ' + str(self.table[1]) +
+                  ' and error bound ' + str(error))
+            if error > table_tolerance:
+                print('error bound is over ' + str(table_tolerance) +
+                      ', the model is estimated without the table')
+                self.table = None
+
+    @property
+    def structure(self):
+        """
+        input: None
+        output: structure list(int, list(floats), list(floats)),
+                          number of non-hypertime dimensions, list
+                          of hypertime radii nad list of wavelengths
+        uses: np.ndarray.tolist()
+        objective: to return the structure in the form used by
+                   other modules
+        """
+        return [self.dim, self.radii.tolist(), self.wavelengths.tolist()]
+
+    def parameters(self):
+        """
+        input: None
+        output: whole_model tuple, C, COV, density_integrals, structure, k
+        uses: None
+        objective: to return parameters in the order of python_module
+        """
+        return (self.C, self.COV, self.density_integrals, self.structure,
+                self.k)
+
+    def predict(self, times):
+        """
+        input: times numpy array n, times for estimation
+        output: freqs numpy array n, estimated frequencies(stat)
+        uses: np.asarray(), np.full(), table_estimates(), estimates()
+        objective: to estimate time-only models in given times, from the
+                   table, if there is one, or directly
+        """
+        times = np.asarray(times, dtype=float).reshape(-1)
+        if self.dim == 0 and len(self.radii) == 0:  # no model
+            return np.full(len(times), self.C[0])  # average
+        if self.table is not None:
+            return table_estimates(self.table, times)
+        return estimates(times.reshape(-1, 1), self.C, self.COV,
+                         self.structure, self.k, self.density_integrals,
+                         self.factors)
+
+    def predict_grid(self, input_coordinates, memory_budget=None,
+                     threads=None):
+        """
+        input: input_coordinates numpy array nxd*, positions IRL (time
+                                                   in the first column)
+               memory_budget int, bytes of temporary arrays for one part
+                                  (None for MEMORY_BUDGET)
+               threads int, number of threads (None for evaluation
+                            without threads)
+        output: freqs numpy array n, frequencies(stat) in positions
+                                     of input_coordinates
+        uses: frequencies(), np.full()
+        objective: to evaluate the model over a grid (projections
+                   of input_coordinates are not cached, the caller can
+                   reuse the memory of input_coordinates)
+        """
+        if self.dim == 0 and len(self.radii) == 0:  # no model
+            return np.full(len(input_coordinates), self.C[0])  # average
+        return frequencies(input_coordinates, self.C, self.COV,
+                           self.structure, self.k, self.density_integrals,
+                           factors=self.factors,
+                           memory_budget=memory_budget, threads=threads,
+                           cache=False)
@@ -2,10 +2,12 @@ import numpy as np
 import learning as lrn
 import model as mdl
 
-def python_function_update(dataset):
+def python_function_update(dataset, resolution=None):
     """
     input: training_coordinates numpy array nxd, measured values in measured
                                                  times
+           resolution float, step of the table in seconds (see
+                             python_function_compile())
     output: probably whole model
     uses: 
     objective: to call warpHypertime and return all parameters of the found
@@ -33,28 +35,71 @@ def python_function_update(dataset):
         lrn.proposed_method(longest, shortest, dataset,
                             edges_of_cell, k,
                             radius, number_of_periods, evaluation)
-    return C_p, COV_p, density_integrals_p, structure_p, k_p
+    return python_function_compile((C_p, COV_p, density_integrals_p,
+                                    structure_p, k_p), resolution)
+
+
+def python_function_compile(whole_model, resolution=None):
+    """
+    input: whole_model mdl.HyperTimeModel or tuple of model parameters,
+                       specificaly: C_p, COV_p, densities_p, structure_p, k_p
+           resolution float, step of the table in seconds
+                             (None or not positive for
+                             mdl.TABLE_RESOLUTION)
+    output: whole_model mdl.HyperTimeModel, frozen model
+    uses: hypertime_model(), mdl.HyperTimeModel()
+    objective: to freeze the model once, time-only models are tabulated
+               and their estimates are interpolated from the table,
+               if its error bound is within mdl.TABLE_TOLERANCE
+               (the table is not saved nor exported)
+    """
+    if resolution is not None and resolution <= 0:  # default from C++
+        resolution = None
+    C_p, COV_p, density_integrals_p, structure_p, k_p =\
+        hypertime_model(whole_model).parameters()
+    return mdl.HyperTimeModel(C_p, COV_p, density_integrals_p, structure_p,
+                              k_p, table_resolution=resolution)
+
+
+def hypertime_model(whole_model):
+    """
+    input: whole_model mdl.HyperTimeModel or tuple of model parameters,
+                       specificaly: C_p, COV_p, densities_p, structure_p, k_p
+    output: whole_model mdl.HyperTimeModel, the same model
+    uses: mdl.HyperTimeModel()
+    objective: to accept models as tuples too (they are not tabulated)
+    """
+    if isinstance(whole_model, mdl.HyperTimeModel):
+        return whole_model
+    C_p, COV_p, density_integrals_p, structure_p, k_p = whole_model[: 5]
+    return mdl.HyperTimeModel(C_p, COV_p, density_integrals_p, structure_p,
+                              k_p, tabulate=False)
 
 
 def python_function_estimate(whole_model, time):
     """
-    input: whole_model tuple of model parameters, specificaly:
-                C_p, COV_p, densities_p, structure_p, k_p
+    input: whole_model mdl.HyperTimeModel, model (or tuple, see
+                                           hypertime_model())
            time float, time for prediction
     output: estimation float, estimation of the event occurence
-    uses:
+    uses: hypertime_model(), mdl.HyperTimeModel.predict()
     objective: to estimate event occurences in the given time
     """
-    ###################################################
-    # otevirani a zavirani dveri, pozitivni i negativni
-    ###################################################
-    if whole_model[3][0] == 0 and len(whole_model[3][1]) == 0:  # no model
-        return whole_model[0][0]  # average
-    else:
-        freq_p = mdl.one_freq(np.array([[time]]), whole_model[0],
-                              whole_model[1], whole_model[3], whole_model[4],
-                              whole_model[2])
-    return float(freq_p[0])
+    return float(hypertime_model(whole_model).predict(np.array([time]))[0])
+
+
+def python_function_estimate_batch(whole_model, times):
+    """
+    input: whole_model mdl.HyperTimeModel, model (or tuple, see
+                                           hypertime_model())
+           times numpy array n, times for prediction
+    output: estimations numpy array n, estimations of the event occurences
+    uses: hypertime_model(), mdl.HyperTimeModel.predict()
+    objective: to estimate event occurences in all given times at once
+               (projections are not cached, the buffer of times can be
+               reused by the caller)
+    """
+    return hypertime_model(whole_model).predict(times)
 
 
 def python_function_save(whole_model, file_path):
@@ -63,6 +108,7 @@ def python_function_save(whole_model, file_path):
     #with open(file_path, 'wb') as opened_file:
     #    np.savez(opened_file, whole_model[0], whole_model[1], whole_model[2],
     #             whole_model[3], whole_model[4])
+    whole_model = hypertime_model(whole_model).parameters()
     structure = whole_model[3]
     dim_hyp = len(structure[1])
     new_structure = [structure[0]]
@@ -74,8 +120,12 @@ def python_function_save(whole_model, file_path):
             structure_to_save, whole_model[4])
 
 
-def python_function_load(file_path):
+def python_function_load(file_path, resolution=None):
     """
+    input: file_path string, path to the saved model (without .npz)
+           resolution float, step of the table in seconds (see
+                             python_function_compile())
+    output: whole_model mdl.HyperTimeModel, frozen model
     """
     with open(file_path + '.npz', 'r') as opened_file:
         npzfile = np.load(opened_file)
@@ -89,13 +139,15 @@ def python_function_load(file_path):
         for j in xrange(dim_hyp):
             sub_list.append(loaded_structure[1 + i * dim_hyp + j])
         structure.append(sub_list)
-    return C_p, COV_p, density_integrals_p, structure, k
+    return python_function_compile((C_p, COV_p, density_integrals_p,
+                                    structure, k), resolution)
 
 
 def python_function_model_to_array(whole_model):
     """
     indian style :)
     """
+    whole_model = hypertime_model(whole_model).parameters()
     # C
     C_0 = whole_model[0]
     shape_C_0 = np.shape(C_0)
@@ -177,8 +229,13 @@ def python_function_model_to_array(whole_model):
     return output_array
 
 
-def python_function_array_to_model(input_array):
+def python_function_array_to_model(input_array, resolution=None):
     """
+    input: input_array numpy array, output of
+                       python_function_model_to_array()
+           resolution float, step of the table in seconds (see
+                             python_function_compile())
+    output: whole_model mdl.HyperTimeModel, frozen model
     """
     number_of_parameters = 5
     len_shapes = []
@@ -223,4 +280,5 @@ def python_function_array_to_model(input_array):
     # k transformation
     k = int(parameters[4])
 
-    return parameters[0], parameters[1], parameters[2], structure, k
+    return python_function_compile((parameters[0], parameters[1],
+                                    parameters[2], structure, k), resolution)